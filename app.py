@@ -1,109 +1,193 @@
+import logging
 import os
 import time
+import uuid
 from src.utils import save_image
-from src.workflow import app as workflow_app
+from src.workflow import app as workflow_app, DEFAULT_SESSION_ID
+from src.state_store import state_store
+from src.exporter import feedback_exporter
+from src.models import model_registry
+from src.embeddings import image_index
+from src.media_store import media_store
+from src.streaming import aiter_events
+from src.executors import cpu_executor, run_in
+from src.telemetry import metrics, span, start_request, payload_logging, log_payload, start_metrics_server
 import gradio as gr
-from langsmith import Client
 from langchain.schema import HumanMessage
-from config import LANGCHAIN_TRACING_V2, LANGCHAIN_API_KEY, LANGCHAIN_PROJECT
+from config import LANGCHAIN_TRACING_V2, LANGCHAIN_API_KEY, LANGCHAIN_PROJECT, PREWARM_MODELS, MEDIA_GC_INTERVAL_SECONDS, METRICS_PORT, GRADIO_CONCURRENCY, GRADIO_QUEUE_SIZE, MODEL_SERVER_ADDRESS
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 # Set environment variables from config.py
 os.environ["LANGCHAIN_TRACING_V2"] = LANGCHAIN_TRACING_V2
 os.environ["LANGCHAIN_API_KEY"] = LANGCHAIN_API_KEY
 os.environ["LANGCHAIN_PROJECT"] = LANGCHAIN_PROJECT
-
-client = Client()
-
-# Initialize variables
-feedback_score = None
-feedback_comment = None
-# context and current_run_id are managed in workflow.py
-
-def gradio_interface(text, image):
-    """Handles the user interaction with text input and image upload."""
-    # No need to declare context as global here since it's managed in workflow.py
+tracing_enabled = LANGCHAIN_TRACING_V2.lower() == "true"
+
+# Keep disk use of the image and audio directories bounded (the model server does this for workers)
+if MEDIA_GC_INTERVAL_SECONDS and not MODEL_SERVER_ADDRESS:
+    media_store.start_gc(MEDIA_GC_INTERVAL_SECONDS)
+
+# Serve Prometheus metrics next to the Gradio app
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+
+# Send feedback left in the spool by earlier processes without waiting for new feedback
+feedback_exporter.start()
+
+# Load the configured models in the background so the UI comes up immediately
+if PREWARM_MODELS:
+    model_registry.prewarm(PREWARM_MODELS)
+
+# Conversation history and the run ids feedback refers to are kept per session in the state store
+
+def format_step(event):
+    """Formats an agent step event as Thought/Action/Observation lines."""
+    lines = []
+    if event["thought"]:
+        lines.append(f"Thought: {event['thought']}")
+    if event["action"]:
+        lines.append(f"Action: {event['action']} {event['action_input']}")
+    if event["observation"] is not None:
+        lines.append(f"Observation: {event['observation']}")
+    if event["error"]:
+        lines.append(f"Error: {event['error']}")
+    return "\n".join(lines)
+
+async def astream_workflow(inputs, to_outputs, streamed, run_id):
+    """Runs the workflow as run run_id, yielding to_outputs(progress_text, audio_chunk) as
+    agent steps, answer tokens and generated audio chunks arrive.
+
+    Sets streamed["audio"] once an audio chunk was sent, and streamed["state"] to the final
+    workflow state.
+    """
+    steps = []
+    answer = ""
+    progress = ""
+    configurable = {"event_sink": None, "verbose_payloads": payload_logging()}
+
+    async def _invoke(sink):
+        start = time.perf_counter()
+        with span("workflow_run"):
+            # The traced root run gets our id, so feedback can refer to it without a tracer lookup
+            state = await workflow_app.ainvoke(
+                inputs, config={"run_id": run_id, "configurable": {**configurable, "event_sink": sink}})
+        if tracing_enabled:
+            feedback_exporter.submit(run_id, "latency_seconds", score=time.perf_counter() - start,
+                                     comment=f"route={state.get('route', 'agent')}")
+        return state
+
+    outcome = {}
+    async for event in aiter_events(_invoke, outcome):
+        if event["type"] == "step":
+            if event["action"] == "final_answer":
+                continue
+            steps.append(format_step(event))
+        elif event["type"] == "answer_token":
+            answer += event["text"]
+        elif event["type"] == "audio_chunk":
+            streamed["audio"] = True
+            yield to_outputs(progress, (event["sample_rate"], event["audio"]))
+            continue
+        else:
+            continue
+        progress = "\n\n".join(steps + ([f"Answer: {answer}"] if answer else []))
+        yield to_outputs(progress, None)
+    streamed["state"] = outcome["result"]
+
+async def gradio_interface(text, image, request: gr.Request = None):
+    """Handles the user interaction with text input and image upload, streaming progress."""
+    # Conversation history is kept per Gradio session in workflow.py
+    session_id = request.session_hash if request is not None and request.session_hash else DEFAULT_SESSION_ID
+    run_id = str(uuid.uuid4())
     response_content = ""
     generated_image_path = None
     generated_audio_path = None
+    streamed = {"audio": False}
+    # Payloads are logged for sampled requests or when the client sends X-Verbose-Payload: 1
+    verbose_header = request.headers.get("x-verbose-payload") if request is not None else None
+    start_request(verbose=verbose_header in ("1", "true", "yes"))
+    metrics.incr("requests_total", kind="image" if image else "text" if text else "empty")
 
-    print("[DEBUG] Received text:", text)
-    print("[DEBUG] Received image:", image)
+    log_payload("Received text: %s", text)
+    log_payload("Received image: %s", image)
 
     try:
         if image:
-            image_filename = f"uploaded_image_{int(time.time())}.png"
-            image_path = save_image(image, image_filename)
-            print(f"[DEBUG] Image saved at: {image_path}")
-
-            print(f"[DEBUG] Sending image path to workflow: {image_path}")
-            final_state = workflow_app.invoke({"messages": [HumanMessage(content=f"Image uploaded: {image_path}")]})
+            image_path = await run_in(cpu_executor, save_image, image, "uploaded_image")
+            log_payload("Image saved at: %s", image_path)
+            # Blocking IPC call when the index lives in the model server
+            await run_in(None, image_index.add_async, image_path)
+
+            log_payload("Sending image path to workflow: %s", image_path)
+            async for outputs in astream_workflow(
+                {"messages": [HumanMessage(content=f"Image uploaded: {image_path}")], "session_id": session_id},
+                lambda progress, audio: (progress, image_path, audio),
+                streamed,
+                run_id
+            ):
+                yield outputs
+            final_state = streamed["state"]
+            await run_in(None, state_store.record_run, session_id, run_id)
 
             response_content = final_state["messages"][-1].content
-            print(f"[DEBUG] Image description: {response_content}")
+            log_payload("Image description: %s", response_content)
 
-            # context is managed in workflow.py
-
-            return f"Image uploaded successfully! Description: {response_content}", image_path, None
+            yield f"Image uploaded successfully! Description: {response_content}", image_path, None
 
         elif text:
-            print(f"[DEBUG] Sending text query to workflow: {text}")
-            final_state = workflow_app.invoke({"messages": [HumanMessage(content=text)]})
+            log_payload("Sending text query to workflow: %s", text)
+            async for outputs in astream_workflow(
+                {"messages": [HumanMessage(content=text)], "session_id": session_id},
+                lambda progress, audio: (progress, None, audio),
+                streamed,
+                run_id
+            ):
+                yield outputs
+            final_state = streamed["state"]
+            await run_in(None, state_store.record_run, session_id, run_id)
 
             response_content = final_state["messages"][-1].content
-            print(f"[DEBUG] Assistant response: {response_content}")
-
-            # context is managed in workflow.py
+            log_payload("Assistant response: %s", response_content)
 
             if ".wav" in response_content.lower():
                 generated_audio_path = response_content
-                print(f"[DEBUG] Detected generated audio at: {generated_audio_path}")
-                return response_content, None, generated_audio_path
+                log_payload("Detected generated audio at: %s", generated_audio_path)
+                # The streaming audio player already received the audio chunk by chunk
+                yield response_content, None, None if streamed["audio"] else generated_audio_path
 
             elif "images/" in response_content.lower():
                 generated_image_path = response_content
-                print(f"[DEBUG] Detected generated image at: {generated_image_path}")
-                return response_content, generated_image_path, None
+                log_payload("Detected generated image at: %s", generated_image_path)
+                yield response_content, generated_image_path, None
 
-            return response_content, None, None
+            else:
+                yield response_content, None, None
 
         else:
-            print("[DEBUG] No text or image received.")
-            return "No input provided.", None, None
+            log_payload("No text or image received.")
+            yield "No input provided.", None, None
 
     except Exception as e:
-        print(f"[DEBUG] Error occurred: {str(e)}")
-        return f"Error occurred: {str(e)}", None, None
+        metrics.incr("request_errors_total")
+        logger.exception("Error handling request")
+        yield f"Error occurred: {str(e)}", None, None
 
-def submit_feedback(feedback_score_input=None, feedback_comment_input=None):
+def submit_feedback(feedback_score_input=None, feedback_comment_input=None, request: gr.Request = None):
     """Function to log user feedback without triggering chatbot."""
-    global feedback_score, feedback_comment
-    feedback_score = feedback_score_input
-    feedback_comment = feedback_comment_input or "No comment"
-    log_feedback()
+    session_id = request.session_hash if request is not None and request.session_hash else DEFAULT_SESSION_ID
+    # Bound to the run whose response the session was last shown, resolved now rather than at send time
+    run_id = state_store.last_run(session_id)
+    if run_id is None or feedback_score_input is None:
+        return "No response to give feedback on yet."
+    # Queued for the background exporter; LangSmith being slow or down never blocks the UI
+    feedback_exporter.submit(run_id, "user-feedback", score=feedback_score_input,
+                             comment=feedback_comment_input or "No comment")
     return "Feedback submitted successfully."
 
-def log_feedback():
-    # Assuming current_run_id is accessible here
-    global current_run_id, feedback_score, feedback_comment
-    if current_run_id is not None and feedback_score is not None:
-        try:
-            client.create_feedback(
-                run_id=current_run_id,
-                key="user-feedback",
-                score=feedback_score,
-                comment=feedback_comment
-            )
-            print(f"Feedback logged successfully for run_id: {current_run_id}")
-        except Exception as e:
-            print(f"Error logging feedback: {str(e)}")
-    else:
-        print("No run_id or feedback score available for logging feedback.")
-
-    feedback_score = None
-    feedback_comment = None
-
 # Gradio interface
-gr.Interface(
+chat_interface = gr.Interface(
     fn=gradio_interface,
     inputs=[
         gr.Textbox(lines=2, placeholder="Type your question here", label="Text Input"),
@@ -112,16 +196,16 @@ gr.Interface(
     outputs=[
         gr.Textbox(lines=5, label="Response"),
         gr.Image(type="filepath", label="Generated or Uploaded Image"),
-        gr.Audio(type="filepath", label="Generated Audio")
+        gr.Audio(type="filepath", label="Generated Audio", streaming=True, autoplay=True)
     ],
     title="Multimodal Chatbot with Live Audio",
     description="Upload an image or ask a question to interact with the chatbot, including audio responses.",
     examples=None,
     allow_flagging="never"
-).launch(debug=True)
+)
 
 # Feedback submission interface
-gr.Interface(
+feedback_interface = gr.Interface(
     fn=submit_feedback,
     inputs=[
         gr.Slider(minimum=-1, maximum=1, step=1, label="Feedback Score"),
@@ -130,4 +214,13 @@ gr.Interface(
     outputs="text",
     title="Submit Feedback",
     description="Submit feedback without re-triggering the chatbot."
-).launch()
+)
+
+# One app on one port; both tabs share the browser session, so feedback finds the session's last run
+demo = gr.TabbedInterface([chat_interface, feedback_interface], ["Chat", "Feedback"])
+
+# Handlers are async, so one worker serves many concurrent chats; the executors bound the real work
+demo.queue(default_concurrency_limit=GRADIO_CONCURRENCY, max_size=GRADIO_QUEUE_SIZE or None)
+
+if __name__ == "__main__":
+    demo.launch()
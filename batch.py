@@ -0,0 +1,163 @@
+"""Runs a JSONL file of tasks through the workflow and tools without the UI.
+
+Usage:
+    python batch.py tasks.jsonl results.jsonl --workers 2 --threads 8
+
+Each input line is one task:
+    {"id": "q1", "text": "Who was Ada Lovelace?"}             answered by the workflow
+    {"id": "img1", "image": "photos/cat.png"}                 captioned by the workflow
+    {"id": "c1", "tool": "compare_image_to_text",
+     "arguments": {"image_path": "photos/cat.png", "description": "a cat | a dog"}}
+
+Results are appended to the output file as they finish, one line per task with its
+output (or error) and timing. Tasks whose id is already in the output file are
+skipped, so an interrupted run is resumed by running the same command again.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_tasks(path):
+    """Yields task dicts from a JSONL file, using the line number as id where none is given."""
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            task = json.loads(line)
+            task.setdefault("id", str(number))
+            yield task
+
+
+def completed_ids(path):
+    """Returns the ids already written to the output file."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue  # A line cut short by an interrupted run; the task is redone
+    return done
+
+
+def run_task(task):
+    """Runs one task in the worker process and returns its result row."""
+    from langchain.schema import HumanMessage
+    from src.tools import tools
+    from src.workflow import app as workflow_app, conversation_store
+
+    start = time.perf_counter()
+    row = {"id": task["id"], "output": None, "error": None}
+    try:
+        if "tool" in task:
+            tool = {tool.name: tool for tool in tools}[task["tool"]]
+            row["output"] = tool(**task.get("arguments", {}))
+        else:
+            content = f"Image uploaded: {task['image']}" if "image" in task else task["text"]
+            session_id = f"batch-{task['id']}"
+            try:
+                final_state = workflow_app.invoke({"messages": [HumanMessage(content=content)],
+                                                   "session_id": session_id})
+            finally:
+                conversation_store.clear(session_id)
+            row["output"] = final_state["messages"][-1].content
+        if isinstance(row["output"], str) and row["output"].startswith("Error"):
+            row["output"], row["error"] = None, row["output"]
+    except Exception as e:
+        row["error"] = str(e)
+    row["seconds"] = time.perf_counter() - start
+    row["worker"] = os.getpid()
+    return row
+
+
+def run_worker(tasks, results, threads):
+    """Worker process: runs tasks from the tasks queue on `threads` threads, so concurrent
+    BLIP/CLIP calls share batched forward passes, and puts each result row on the results
+    queue as soon as its task finishes. Each thread stops at a None task.
+    """
+    import src.workflow  # noqa: F401  Load the tools once, before the first task
+
+    def _run():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            results.put(run_task(task))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for _ in range(threads):
+            pool.submit(_run)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of tasks")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes, each with its own models")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Concurrent tasks per worker (default: BATCH_MAX_SIZE)")
+    args = parser.parse_args(argv)
+
+    from config import BATCH_MAX_SIZE
+    threads = args.threads or BATCH_MAX_SIZE
+
+    done = completed_ids(args.output)
+    pending = [task for task in read_tasks(args.input) if task["id"] not in done]
+    print(f"{len(done)} task(s) already done, {len(pending)} to run")
+    if not pending:
+        return 0
+
+    tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+    for task in pending:
+        tasks.put(task)
+    for _ in range(args.workers * threads):
+        tasks.put(None)
+    workers = [multiprocessing.Process(target=run_worker, args=(tasks, results, threads), daemon=True)
+               for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+
+    start = time.perf_counter()
+    last_report = 0.0
+    finished = errors = 0
+    with open(args.output, "a") as out:
+        try:
+            while finished < len(pending):
+                try:
+                    row = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        print(f"Workers exited with {len(pending) - finished} task(s) unfinished; "
+                              "run the same command again to resume")
+                        return 1
+                    continue
+                # Written as soon as it arrives, so an interrupt loses no finished task
+                out.write(json.dumps(row) + "\n")
+                out.flush()
+                finished += 1
+                errors += row["error"] is not None
+                elapsed = time.perf_counter() - start
+                if elapsed - last_report >= 1.0 or finished == len(pending):
+                    last_report = elapsed
+                    print(f"{finished}/{len(pending)} done ({errors} errors), {finished / elapsed:.2f} tasks/s")
+        except KeyboardInterrupt:
+            print("Interrupted; run the same command again to resume")
+            return 130
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Checks BLIP captions and CLIP embeddings of a vision runtime against eager fp32.
+
+Usage:
+    python -m benchmarks.accuracy --runtime int8 --images path/to/images --output accuracy.json
+
+Runs both models in fp32 and in the given runtime on the same sorted image set. For
+BLIP it reports the exact caption match rate and the mean token F1 against the fp32
+captions. For CLIP it reports the mean cosine similarity between the image embeddings,
+and how often the best-matching fp32 caption for each image stays the same. Per-image
+latency and the memory each model adds are reported for both runtimes.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+def token_f1(reference, candidate):
+    """Token-overlap F1 between two captions."""
+    ref, cand = reference.lower().split(), candidate.lower().split()
+    common = sum((Counter(ref) & Counter(cand)).values())
+    if not ref or not cand or not common:
+        return float(ref == cand)
+    precision, recall = common / len(cand), common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _load(loader, runtime):
+    from src.registry import _rss_bytes
+    before = _rss_bytes()
+    processor, model = loader(runtime=runtime)
+    return processor, model, (_rss_bytes() - before) / (1024 * 1024)
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_blip(images, runtime):
+    import torch
+    from src.models import _load_blip
+    processor, model, memory_mb = _load(_load_blip, runtime)
+    captions, seconds = [], []
+    with torch.inference_mode():
+        for image in images:
+            pixel_values = processor(images=image, return_tensors="pt")["pixel_values"]
+            out, elapsed = _timed(lambda: model.generate(pixel_values=pixel_values))
+            captions.append(processor.decode(out[0], skip_special_tokens=True))
+            seconds.append(elapsed)
+    return captions, seconds, memory_mb
+
+
+def run_clip(images, texts, runtime):
+    import torch
+    from src.models import _load_clip
+    processor, model, memory_mb = _load(_load_clip, runtime)
+    embeddings, seconds = [], []
+    with torch.inference_mode():
+        for image in images:
+            pixel_values = processor(images=image, return_tensors="pt")["pixel_values"]
+            features, elapsed = _timed(lambda: model.get_image_features(pixel_values=pixel_values))
+            embeddings.append(torch.nn.functional.normalize(features, dim=-1)[0])
+            seconds.append(elapsed)
+        text_inputs = processor(text=texts, return_tensors="pt", padding=True)
+        text_embeddings = torch.nn.functional.normalize(model.get_text_features(**text_inputs), dim=-1)
+    return torch.stack(embeddings), text_embeddings, seconds, memory_mb
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runtime", choices=["int8", "onnx"], default="int8")
+    parser.add_argument("--images", default=None, help="Directory of test images (default: IMAGE_DIR)")
+    parser.add_argument("--limit", type=int, default=50, help="Use the first N images in name order")
+    parser.add_argument("--output", default="accuracy_output.json")
+    args = parser.parse_args(argv)
+
+    from PIL import Image
+    from config import IMAGE_DIR
+
+    image_dir = args.images or IMAGE_DIR
+    names = sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))[:args.limit]
+    if not names:
+        print(f"No images found in {image_dir}")
+        return 1
+    images = [Image.open(os.path.join(image_dir, name)).convert("RGB") for name in names]
+
+    reference_captions, reference_seconds, reference_blip_mb = run_blip(images, "eager")
+    captions, blip_seconds, blip_mb = run_blip(images, args.runtime)
+    blip = {
+        "exact_match": _mean([float(a == b) for a, b in zip(reference_captions, captions)]),
+        "token_f1": _mean([token_f1(a, b) for a, b in zip(reference_captions, captions)]),
+        "eager_ms_per_image": _mean(reference_seconds) * 1000,
+        "runtime_ms_per_image": _mean(blip_seconds) * 1000,
+        "eager_memory_mb": reference_blip_mb,
+        "runtime_memory_mb": blip_mb,
+    }
+
+    reference_images, reference_texts, reference_clip_seconds, reference_clip_mb = run_clip(
+        images, reference_captions, "eager")
+    runtime_images, runtime_texts, clip_seconds, clip_mb = run_clip(images, reference_captions, args.runtime)
+    reference_best = (reference_images @ reference_texts.T).argmax(dim=-1)
+    runtime_best = (runtime_images @ runtime_texts.T).argmax(dim=-1)
+    clip = {
+        "image_embedding_cosine": (reference_images * runtime_images).sum(dim=-1).mean().item(),
+        "text_embedding_cosine": (reference_texts * runtime_texts).sum(dim=-1).mean().item(),
+        "top1_agreement": (reference_best == runtime_best).float().mean().item(),
+        "eager_ms_per_image": _mean(reference_clip_seconds) * 1000,
+        "runtime_ms_per_image": _mean(clip_seconds) * 1000,
+        "eager_memory_mb": reference_clip_mb,
+        "runtime_memory_mb": clip_mb,
+    }
+
+    report = {
+        "runtime": args.runtime,
+        "images": names,
+        "blip": blip,
+        "clip": clip,
+        "captions": [
+            {"image": name, "eager": a, args.runtime: b}
+            for name, a, b in zip(names, reference_captions, captions)
+        ],
+    }
+    for model, summary in (("blip", blip), ("clip", clip)):
+        print(f"{model}: " + ", ".join(f"{key} {value:.3f}" for key, value in summary.items()))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
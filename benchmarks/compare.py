@@ -0,0 +1,51 @@
+"""Compares two benchmark result files written by benchmarks.run.
+
+Usage:
+    python -m benchmarks.compare before.json after.json
+"""
+import json
+import sys
+
+METRICS = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "mean_agent_iterations", "peak_rss_mb"]
+
+
+def _scenarios(results):
+    for name, summary in results.items():
+        if "p50_ms" in summary:
+            yield name, summary
+        else:
+            for tool, tool_summary in summary.items():
+                yield f"{name}/{tool}", tool_summary
+
+
+def compare(before, after):
+    """Returns rows of (scenario, metric, before, after, relative change)."""
+    old = dict(_scenarios(before["results"]))
+    rows = []
+    for name, summary in _scenarios(after["results"]):
+        if name not in old:
+            continue
+        for metric in METRICS:
+            if metric in summary and metric in old[name]:
+                a, b = old[name][metric], summary[metric]
+                rows.append((name, metric, a, b, (b - a) / a if a else 0.0))
+    return rows
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__)
+        return 2
+    with open(argv[0]) as f:
+        before = json.load(f)
+    with open(argv[1]) as f:
+        after = json.load(f)
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    for name, metric, a, b, change in compare(before, after):
+        print(f"{name:40} {metric:24} {a:12.2f} {b:12.2f} {change:+8.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""Offline benchmark of the workflow and tools against local stand-ins.
+
+Usage:
+    python -m benchmarks.run --concurrency 8 --requests 64 --output bench.json
+
+Reports p50/p95/p99 latency, throughput, agent iterations per query and peak RSS for
+each scenario and writes them as JSON; compare two result files with
+`python -m benchmarks.compare before.json after.json`.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+WORKFLOW_QUERIES = [
+    "Who was Ada Lovelace?",
+    "generate an image of a lighthouse at dusk",
+    "say: Hello there. This is a scripted audio benchmark. It has three sentences.",
+    "What is the capital of Australia?",
+]
+
+
+def percentile(values, q):
+    """Returns the q-th percentile of values using linear interpolation."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+
+
+def measure(fn, items, concurrency):
+    """Calls fn on every item with the given concurrency and summarises the latencies.
+
+    fn returns a dict of extra per-call numbers (e.g. llm_calls), which are averaged.
+    """
+    def _timed(item):
+        start = time.perf_counter()
+        error = None
+        extra = {}
+        try:
+            extra = fn(item) or {}
+        except Exception as e:
+            error = str(e)
+        return time.perf_counter() - start, extra, error
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_timed, items))
+    wall = time.perf_counter() - start
+
+    latencies = [latency for latency, _, error in results if error is None]
+    summary = {
+        "requests": len(items),
+        "errors": sum(1 for _, _, error in results if error is not None),
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "throughput_rps": len(items) / wall if wall else 0.0,
+        "p50_ms": (percentile(latencies, 50) or 0) * 1000,
+        "p95_ms": (percentile(latencies, 95) or 0) * 1000,
+        "p99_ms": (percentile(latencies, 99) or 0) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    keys = {key for _, extra, _ in results for key in extra}
+    for key in sorted(keys):
+        values = [extra[key] for _, extra, _ in results if key in extra]
+        summary[f"mean_{key}"] = sum(values) / len(values)
+    return summary
+
+
+def bench_workflow(args, sample_image):
+    from langchain.schema import HumanMessage
+    from src.workflow import app as workflow_app
+    from benchmarks.stubs import llm_call_counter
+
+    queries = WORKFLOW_QUERIES + [f"Image uploaded: {sample_image}"]
+    items = [(i, queries[i % len(queries)]) for i in range(args.requests)]
+
+    def _run(item):
+        index, query = item
+        counter = [0]
+        token = llm_call_counter.set(counter)
+        try:
+            final_state = workflow_app.invoke({"messages": [HumanMessage(content=query)],
+                                               "session_id": f"bench-{index % args.concurrency}"})
+        finally:
+            llm_call_counter.reset(token)
+        if final_state["messages"][-1].content.startswith("Error"):
+            raise RuntimeError(final_state["messages"][-1].content)
+        return {"agent_iterations": counter[0]}
+
+    return measure(_run, items, args.concurrency)
+
+
+def bench_tools(args, sample_image):
+    import src.tools as tools
+
+    calls = {
+        "wiki_search": lambda i: tools.wiki_tool.forward(f"benchmark topic {i}"),
+        "gpt_text_response": lambda i: tools.gpt_text_response.forward(f"benchmark question {i}"),
+        "blip_image_caption": lambda i: tools.blip_image_caption.forward(sample_image),
+        "compare_image_to_text": lambda i: tools.compare_image_to_text.forward(
+            sample_image, "a lighthouse | a cat | a bowl of fruit"),
+        "generate_image": lambda i: tools.generate_image.forward(f"benchmark scene {i}"),
+        "generate_audio_from_text": lambda i: tools.generate_audio_from_text.forward(
+            "Benchmark audio. Two short sentences."),
+        "search_images": lambda i: tools.search_images.forward("a lighthouse"),
+    }
+    selected = args.tools.split(",") if args.tools else list(calls)
+    results = {}
+    for name in selected:
+        def _run(i, call=calls[name]):
+            output = call(i)
+            if str(output).startswith("Error"):
+                raise RuntimeError(output)
+        results[name] = measure(_run, list(range(args.requests)), args.concurrency)
+        print(f"{name}: p50 {results[name]['p50_ms']:.1f} ms, {results[name]['throughput_rps']:.2f} req/s")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def use_scratch_dirs(scratch):
+    """Points every path the app writes to at scratch; must run before config is imported.
+
+    Benchmark images, fake CLIP embeddings, sessions and cached responses then never mix
+    with the real ones.
+    """
+    os.environ.update(
+        IMAGE_DIR=os.path.join(scratch, "images"),
+        AUDIO_DIR=os.path.join(scratch, "audio"),
+        CACHE_DIR=os.path.join(scratch, "cache"),
+        IMAGE_INDEX_PATH=os.path.join(scratch, "images", ".clip_index.pt"),
+        STATE_STORE_PATH=os.path.join(scratch, "state.sqlite3"),
+        RESPONSE_CACHE_PATH=os.path.join(scratch, "responses.sqlite3"),
+        VARIANT_DIR=os.path.join(scratch, "cache", "variants"),
+        EXPORT_SPOOL_DIR=os.path.join(scratch, "spool"),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["workflow", "tools", "all"], default="all")
+    parser.add_argument("--tools", default="", help="Comma-separated tool names to benchmark (default: all)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20, help="Requests per scenario")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--image-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--audio-latency-ms-per-char", type=float, default=20.0)
+    parser.add_argument("--wiki-latency-ms", type=float, default=300.0)
+    parser.add_argument("--real-vision", action="store_true", help="Use the real BLIP and CLIP models")
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="bench-")
+    use_scratch_dirs(scratch)
+    from benchmarks import stubs
+    from src.utils import save_image
+
+    stubs.install(
+        llm_latency_ms=args.llm_latency_ms,
+        image_latency_ms=args.image_latency_ms,
+        audio_latency_ms_per_char=args.audio_latency_ms_per_char,
+        wiki_latency_ms=args.wiki_latency_ms,
+        fake_vision=not args.real_vision,
+        response_cache_path=os.path.join(scratch, "responses.sqlite3"),
+    )
+    sample_image = save_image(Image.new("RGB", (640, 480), (40, 90, 160)), "benchmark_image")
+
+    results = {}
+    if args.scenario in ("workflow", "all"):
+        results["workflow"] = bench_workflow(args, sample_image)
+        print(f"workflow: p50 {results['workflow']['p50_ms']:.1f} ms, "
+              f"{results['workflow']['throughput_rps']:.2f} req/s")
+    if args.scenario in ("tools", "all"):
+        results["tools"] = bench_tools(args, sample_image)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
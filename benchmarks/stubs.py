@@ -0,0 +1,204 @@
+"""Deterministic local stand-ins for the remote endpoints and models, for offline benchmarks."""
+import contextvars
+import hashlib
+import json
+import re
+import time
+import numpy as np
+import torch
+from PIL import Image
+
+# Number of LLM calls made for the query being measured; set by the caller per query.
+llm_call_counter = contextvars.ContextVar("llm_call_counter", default=None)
+
+
+def _seed(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+
+class ScriptedLLMEngine:
+    """Plays the ReactJsonAgent protocol with a fixed plan per kind of query.
+
+    Image uploads are captioned, "generate an image ..." and "... audio ..." requests go
+    to the generation tools and anything else to wiki_search; the last observation is
+    then returned through final_answer. Calls without the agent system prompt (from
+    gpt_text_response) get a canned reply.
+    """
+
+    def __init__(self, latency_ms=200.0):
+        self.latency_ms = latency_ms
+
+    def _plan(self, query):
+        upload = re.search(r"Image uploaded:\s*(\S+)", query)
+        if upload:
+            return [("blip_image_caption", {"image_path": upload.group(1)})]
+        image = re.search(r"generate (?:an |a )?(?:image|picture) of (.+)", query, re.IGNORECASE)
+        if image:
+            return [("generate_image", {"prompt": image.group(1).strip()})]
+        audio = re.search(r"(?:audio|say|speak)\b(?: of)?[:\s]+(.+)", query, re.IGNORECASE)
+        if audio:
+            return [("generate_audio_from_text", {"prompt": audio.group(1).strip()})]
+        return [("wiki_search", {"query": query.strip()})]
+
+    def __call__(self, messages, stop_sequences=[], grammar=None):
+        _sleep_ms(self.latency_ms)
+        counter = llm_call_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+        contents = [str(m["content"]) for m in messages]
+        if len(messages) == 1:
+            return f"Scripted answer to: {contents[0][:200]}"
+
+        task = next((c for c in contents if "Current query:" in c), contents[-1])
+        query = task.split("Current query:", 1)[-1].strip().splitlines()[0] if "Current query:" in task else task
+        plan = self._plan(query)
+        step = sum(1 for m in messages if getattr(m["role"], "value", m["role"]) == "assistant")
+        # contents[0] is the system prompt, whose examples contain observations too
+        observations = [c.split("Observation:", 1)[1].strip() for c in contents[1:] if "Observation:" in c]
+
+        if step < len(plan):
+            tool_name, arguments = plan[step]
+            return (f"Thought: I will use {tool_name}.\nAction:\n"
+                    + json.dumps({"action": tool_name, "action_input": arguments}))
+        answer = observations[-1] if observations else "No observation."
+        return ("Thought: I can now answer.\nAction:\n"
+                + json.dumps({"action": "final_answer", "action_input": {"answer": answer}}))
+
+
+class FakeImageClient:
+    """Stands in for the Stable Diffusion InferenceClient."""
+
+    def __init__(self, latency_ms=1500.0, size=512):
+        self.latency_ms = latency_ms
+        self.size = size
+
+    def text_to_image(self, prompt, **kwargs):
+        _sleep_ms(self.latency_ms)
+        rng = np.random.default_rng(_seed(prompt))
+        pixels = rng.integers(0, 256, size=(self.size // 8, self.size // 8, 3), dtype=np.uint8)
+        return Image.fromarray(pixels).resize((self.size, self.size), Image.NEAREST)
+
+
+class FakeBark:
+    """Stands in for bark.generate_audio; latency grows with the text length like Bark's does."""
+
+    def __init__(self, latency_ms_per_char=20.0, sample_rate=24000):
+        self.latency_ms_per_char = latency_ms_per_char
+        self.sample_rate = sample_rate
+
+    def __call__(self, text, history_prompt=None, output_full=False, **kwargs):
+        _sleep_ms(self.latency_ms_per_char * len(text))
+        seconds = 0.06 * max(len(text), 1)
+        t = np.arange(int(seconds * self.sample_rate), dtype=np.float32) / self.sample_rate
+        audio = (0.1 * np.sin(2 * np.pi * (200 + _seed(text) % 200) * t)).astype(np.float32)
+        if output_full:
+            return {"semantic_prompt": np.zeros(1, dtype=np.int64)}, audio
+        return audio
+
+
+class FakeWiki:
+    """Stands in for WikipediaAPIWrapper."""
+
+    def __init__(self, latency_ms=300.0):
+        self.latency_ms = latency_ms
+
+    def run(self, query):
+        _sleep_ms(self.latency_ms)
+        return f"Page: {query}\nSummary: Scripted summary for '{query}'."
+
+
+class FakeProcessor:
+    """Minimal BLIP/CLIP processor: resizes images to a fixed square and hashes words to ids."""
+
+    def __init__(self, size, vocab_size=1000):
+        self.size = size
+        self.vocab_size = vocab_size
+
+    def __call__(self, images=None, text=None, return_tensors="pt", padding=False, **kwargs):
+        out = {}
+        if images is not None:
+            images = images if isinstance(images, (list, tuple)) else [images]
+            arrays = [np.asarray(image.convert("RGB").resize((self.size, self.size)), dtype=np.float32) / 255.0
+                      for image in images]
+            out["pixel_values"] = torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2).contiguous()
+        if text is not None:
+            texts = text if isinstance(text, (list, tuple)) else [text]
+            ids = [[_seed(word) % (self.vocab_size - 1) + 1 for word in t.lower().split()] or [1] for t in texts]
+            width = max(len(row) for row in ids)
+            out["input_ids"] = torch.tensor([row + [0] * (width - len(row)) for row in ids])
+            out["attention_mask"] = (out["input_ids"] != 0).long()
+        return out
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [f"a scripted caption {int(row.sum()) % 97}" for row in sequences]
+
+    def decode(self, sequence, skip_special_tokens=True):
+        return self.batch_decode([sequence])[0]
+
+
+class FakeBlip(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.proj = torch.nn.Linear(3 * 8 * 8, 8)
+
+    def generate(self, pixel_values=None, **kwargs):
+        pooled = torch.nn.functional.adaptive_avg_pool2d(pixel_values, 8).flatten(1)
+        return (self.proj(pooled).abs() * 100).long()
+
+
+class FakeClip(torch.nn.Module):
+    def __init__(self, dim=64, vocab_size=1000):
+        super().__init__()
+        torch.manual_seed(0)
+        self.image_proj = torch.nn.Linear(3 * 8 * 8, dim)
+        self.text_embed = torch.nn.EmbeddingBag(vocab_size, dim, mode="mean", padding_idx=0)
+        self.logit_scale = torch.nn.Parameter(torch.tensor(4.6052))
+
+    def get_image_features(self, pixel_values=None, **kwargs):
+        return self.image_proj(torch.nn.functional.adaptive_avg_pool2d(pixel_values, 8).flatten(1))
+
+    def get_text_features(self, input_ids=None, attention_mask=None, **kwargs):
+        return self.text_embed(input_ids)
+
+
+def _offline_tokenizer():
+    raise RuntimeError("no tokenizer in offline benchmarks")
+
+
+def install(llm_latency_ms=200.0, image_latency_ms=1500.0, audio_latency_ms_per_char=20.0,
+            wiki_latency_ms=300.0, fake_vision=True, response_cache_path=None):
+    """Swaps the stand-ins into the loaded app modules and returns the scripted LLM engine.
+
+    With fake_vision the BLIP and CLIP models are replaced too, so no model weights are
+    needed. With response_cache_path the tools use an empty cache at that path, so
+    repeated queries are measured uncached.
+    """
+    import src.models as models
+    import src.tools as tools
+    import src.workflow as workflow
+    from src.response_cache import ResponseCache
+
+    engine = ScriptedLLMEngine(llm_latency_ms)
+    models.llm_engine = engine
+    tools.llm_engine = engine
+    workflow.llm_engine = engine
+    while not workflow._agent_pool.empty():
+        workflow._agent_pool.get_nowait()
+
+    tools.wiki_wrapper = FakeWiki(wiki_latency_ms)
+    models.model_registry.register("llm_tokenizer", _offline_tokenizer)
+    models.model_registry.register("client_sd", lambda: FakeImageClient(image_latency_ms))
+    models.model_registry.register("bark", lambda: FakeBark(audio_latency_ms_per_char, models.SAMPLE_RATE))
+    if fake_vision:
+        models.model_registry.register("blip", lambda: (FakeProcessor(384), FakeBlip()))
+        models.model_registry.register("clip", lambda: (FakeProcessor(224), FakeClip()))
+    if response_cache_path is not None:
+        tools.response_cache = ResponseCache(response_cache_path)
+    return engine
@@ -9,8 +9,155 @@ LANGCHAIN_TRACING_V2 = "true"
 LANGCHAIN_API_KEY = LANGCHAIN_KEY
 LANGCHAIN_PROJECT = "langgraph_multiM"
 
-IMAGE_DIR = os.path.join(os.getcwd(), 'images')
-AUDIO_DIR = os.path.join(os.getcwd(), 'audio')
+IMAGE_DIR = os.getenv('IMAGE_DIR', os.path.join(os.getcwd(), 'images'))
+AUDIO_DIR = os.getenv('AUDIO_DIR', os.path.join(os.getcwd(), 'audio'))
 
 os.makedirs(IMAGE_DIR, exist_ok=True)
 os.makedirs(AUDIO_DIR, exist_ok=True)
+
+# Model registry: models load on first use; least recently used ones are evicted
+# once their combined size exceeds the budget (unset means no limit).
+MODEL_MEMORY_BUDGET_MB = float(os.getenv('MODEL_MEMORY_BUDGET_MB', '0')) or None
+# Comma-separated registry names to load in the background at startup, e.g. "blip,clip".
+PREWARM_MODELS = [name.strip() for name in os.getenv('PREWARM_MODELS', '').split(',') if name.strip()]
+
+# Micro-batching of BLIP/CLIP requests from concurrent sessions: a batch is run once it
+# holds BATCH_MAX_SIZE items or BATCH_WINDOW_MS after its first item arrived.
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '8'))
+BATCH_WINDOW_MS = float(os.getenv('BATCH_WINDOW_MS', '10'))
+
+# CLIP embeddings: image embeddings are persisted by content hash in IMAGE_INDEX_PATH,
+# text embeddings are kept in an in-memory LRU.
+IMAGE_INDEX_PATH = os.getenv('IMAGE_INDEX_PATH', os.path.join(IMAGE_DIR, '.clip_index.pt'))
+TEXT_EMBEDDING_CACHE_SIZE = int(os.getenv('TEXT_EMBEDDING_CACHE_SIZE', '1024'))
+# Cosine similarity above which an image is reported as matching a single description.
+CLIP_MATCH_THRESHOLD = float(os.getenv('CLIP_MATCH_THRESHOLD', '0.25'))
+
+# Per-session conversation memory: the last SESSION_MAX_TURNS turns are kept, at most
+# SESSION_CONTEXT_TOKENS LLM tokens of them are sent to the agent, and sessions idle for
+# SESSION_IDLE_TTL_SECONDS are dropped. AGENT_POOL_SIZE agents are kept for reuse.
+SESSION_MAX_TURNS = int(os.getenv('SESSION_MAX_TURNS', '20'))
+SESSION_CONTEXT_TOKENS = int(os.getenv('SESSION_CONTEXT_TOKENS', '256'))
+SESSION_IDLE_TTL_SECONDS = float(os.getenv('SESSION_IDLE_TTL_SECONDS', '3600'))
+AGENT_POOL_SIZE = int(os.getenv('AGENT_POOL_SIZE', '4'))
+
+# Persistent response cache for wiki_search and gpt_text_response. TTLs are given in
+# seconds per tool as "tool=seconds,..."; a semantic threshold above 0 also serves
+# near-duplicate queries whose CLIP text embeddings have at least that cosine similarity.
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(os.getcwd(), 'cache'))
+os.makedirs(CACHE_DIR, exist_ok=True)
+RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join(CACHE_DIR, 'responses.sqlite3'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '10000'))
+RESPONSE_CACHE_TTLS = {
+    tool.strip(): float(seconds)
+    for tool, seconds in (
+        item.split('=') for item in
+        os.getenv('RESPONSE_CACHE_TTLS', 'wiki_search=604800,gpt_text_response=86400').split(',') if item.strip()
+    )
+}
+RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv('RESPONSE_CACHE_SEMANTIC_THRESHOLD', '0'))
+
+# Bark synthesis: prompts are split into sentence chunks of at most AUDIO_CHUNK_CHARS
+# characters, generated on AUDIO_WORKERS threads and streamed as they finish. AUDIO_VOICE
+# is an optional Bark speaker preset (e.g. "v2/en_speaker_6"); without it the voice of
+# the first chunk is reused for the rest.
+AUDIO_CHUNK_CHARS = int(os.getenv('AUDIO_CHUNK_CHARS', '220'))
+AUDIO_WORKERS = int(os.getenv('AUDIO_WORKERS', '2'))
+AUDIO_VOICE = os.getenv('AUDIO_VOICE') or None
+AUDIO_CHUNK_PAUSE_SECONDS = float(os.getenv('AUDIO_CHUNK_PAUSE_SECONDS', '0.2'))
+
+# Media store: uploads and generated files are stored under their content hash, with
+# model-ready image variants in VARIANT_DIR. Every MEDIA_GC_INTERVAL_SECONDS, files older
+# than MEDIA_MAX_AGE_SECONDS and then the oldest files beyond MEDIA_MAX_BYTES are deleted.
+VARIANT_DIR = os.getenv('VARIANT_DIR', os.path.join(CACHE_DIR, 'variants'))
+MEDIA_MAX_BYTES = int(float(os.getenv('MEDIA_MAX_MB', '2048')) * 1024 * 1024) or None
+MEDIA_MAX_AGE_SECONDS = float(os.getenv('MEDIA_MAX_AGE_SECONDS', str(7 * 24 * 3600))) or None
+MEDIA_GC_INTERVAL_SECONDS = float(os.getenv('MEDIA_GC_INTERVAL_SECONDS', '600'))
+
+# Shared preprocessing: number of decoded images and of BLIP/CLIP pixel tensors kept in memory.
+PREPROCESS_CACHE_IMAGES = int(os.getenv('PREPROCESS_CACHE_IMAGES', '32'))
+PREPROCESS_CACHE_TENSORS = int(os.getenv('PREPROCESS_CACHE_TENSORS', '64'))
+
+# Telemetry: Prometheus metrics are served on METRICS_PORT (0 disables the endpoint).
+# Payloads (messages, prompts, responses) are logged for a TRACE_PAYLOAD_SAMPLE_RATE
+# fraction of requests, and for any request sent with the X-Verbose-Payload: 1 header.
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+TRACE_PAYLOAD_SAMPLE_RATE = float(os.getenv('TRACE_PAYLOAD_SAMPLE_RATE', '0'))
+
+# Fast-path routing: image uploads, explicit "generate an image/audio of ..." requests and
+# simple factual questions go straight to their tool instead of through the agent.
+FAST_PATH_ROUTING = os.getenv('FAST_PATH_ROUTING', 'true').lower() in ('1', 'true', 'yes')
+
+# LLM backend: "hf" calls the Hugging Face Inference API, "local" runs LOCAL_LLM_MODEL_ID on
+# the CPU in-process (optionally with int8 linear layers) and reuses the KV cache of the
+# LLM_PREFIX_CACHE_ENTRIES most recent prompts, so the system prompt is not recomputed.
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'hf').lower()
+LOCAL_LLM_MODEL_ID = os.getenv('LOCAL_LLM_MODEL_ID', 'Qwen/Qwen2.5-1.5B-Instruct')
+LOCAL_LLM_QUANTIZE = os.getenv('LOCAL_LLM_QUANTIZE', 'true').lower() in ('1', 'true', 'yes')
+LOCAL_LLM_MAX_NEW_TOKENS = int(os.getenv('LOCAL_LLM_MAX_NEW_TOKENS', '512'))
+LLM_PREFIX_CACHE_ENTRIES = int(os.getenv('LLM_PREFIX_CACHE_ENTRIES', '4'))
+
+# Vision runtime for BLIP and CLIP: "eager" (fp32 PyTorch), "int8" (dynamically quantized
+# linear layers) or "onnx" (CLIP's image tower in ONNX Runtime, exported to ONNX_DIR; BLIP
+# uses int8). TORCH_NUM_THREADS sets the intra-op thread count (0 keeps the default).
+# Check the accuracy of a mode against fp32 with `python -m benchmarks.accuracy`.
+VISION_RUNTIME = os.getenv('VISION_RUNTIME', 'eager').lower()
+TORCH_NUM_THREADS = int(os.getenv('TORCH_NUM_THREADS', '0'))
+ONNX_DIR = os.getenv('ONNX_DIR', os.path.join(CACHE_DIR, 'onnx'))
+
+# Inference API clients: keep-alive connections are pooled (CLIENT_POOL_SIZE per host) and
+# each endpoint (llm, stable_diffusion) allows a limited number of concurrent requests, e.g.
+# CLIENT_CONCURRENCY="llm=8,stable_diffusion=2". Rate-limited and failed requests are retried
+# with backoff until CLIENT_DEADLINE_SECONDS. With IMAGE_SEED set, image generation is
+# deterministic and the last CLIENT_RESULT_CACHE_SIZE results are reused.
+CLIENT_POOL_SIZE = int(os.getenv('CLIENT_POOL_SIZE', '16'))
+CLIENT_CONCURRENCY = {
+    endpoint.strip(): int(limit)
+    for endpoint, limit in (
+        item.split('=') for item in
+        os.getenv('CLIENT_CONCURRENCY', 'llm=8,stable_diffusion=2').split(',') if item.strip()
+    )
+}
+CLIENT_DEFAULT_CONCURRENCY = int(os.getenv('CLIENT_DEFAULT_CONCURRENCY', '4'))
+CLIENT_TIMEOUT_SECONDS = float(os.getenv('CLIENT_TIMEOUT_SECONDS', '60'))
+CLIENT_DEADLINE_SECONDS = float(os.getenv('CLIENT_DEADLINE_SECONDS', '120'))
+CLIENT_MAX_ATTEMPTS = int(os.getenv('CLIENT_MAX_ATTEMPTS', '4'))
+CLIENT_RESULT_CACHE_SIZE = int(os.getenv('CLIENT_RESULT_CACHE_SIZE', '256'))
+IMAGE_SEED = int(os.getenv('IMAGE_SEED')) if os.getenv('IMAGE_SEED') else None
+
+# Multi-worker deployment (see launch.py): workers started with MODEL_SERVER_ADDRESS call
+# BLIP, CLIP, Bark and the image index in a shared model server, authenticated with
+# MODEL_SERVER_AUTHKEY. The server unpickles what it receives, so there is no default key:
+# launch.py generates one per launch. MODEL_SERVER_ADDRESS is host:port or a Unix socket
+# path. With SESSION_BACKEND=sqlite, conversation history is kept in
+# STATE_STORE_PATH so any worker can serve any session; runs are always recorded there.
+MODEL_SERVER_ADDRESS = os.getenv('MODEL_SERVER_ADDRESS') or None
+MODEL_SERVER_AUTHKEY = os.getenv('MODEL_SERVER_AUTHKEY', '')
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory').lower()
+STATE_STORE_PATH = os.getenv('STATE_STORE_PATH', os.path.join(CACHE_DIR, 'state.sqlite3'))
+
+# Feedback export: user feedback and run metadata are sent to LangSmith from a background
+# queue of EXPORT_QUEUE_SIZE items, in batches of EXPORT_BATCH_SIZE at least every
+# EXPORT_FLUSH_SECONDS. Items that cannot be sent are spooled to EXPORT_SPOOL_DIR and
+# retried every EXPORT_REPLAY_SECONDS.
+EXPORT_QUEUE_SIZE = int(os.getenv('EXPORT_QUEUE_SIZE', '1000'))
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '50'))
+EXPORT_FLUSH_SECONDS = float(os.getenv('EXPORT_FLUSH_SECONDS', '2'))
+EXPORT_SPOOL_DIR = os.getenv('EXPORT_SPOOL_DIR', os.path.join(CACHE_DIR, 'spool'))
+EXPORT_REPLAY_SECONDS = float(os.getenv('EXPORT_REPLAY_SECONDS', '60'))
+
+# Agent budgets: a run is stopped after AGENT_DEADLINE_SECONDS or once it has used
+# AGENT_TOKEN_BUDGET LLM tokens (prompt and completion), and the best answer so far is
+# returned. 0 disables a limit. Repeated identical tool calls within a run are always
+# answered from the run's earlier observation.
+AGENT_DEADLINE_SECONDS = float(os.getenv('AGENT_DEADLINE_SECONDS', '90'))
+AGENT_TOKEN_BUDGET = int(os.getenv('AGENT_TOKEN_BUDGET', '40000'))
+
+# Async serving: local BLIP/CLIP/Bark work runs on INFERENCE_THREADS threads (0 = one per
+# core) and synchronous agent runs on AGENT_THREADS threads. Remote calls are awaited on the
+# event loop, so Gradio can keep GRADIO_CONCURRENCY requests in flight and queue up to
+# GRADIO_QUEUE_SIZE more.
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '0'))
+AGENT_THREADS = int(os.getenv('AGENT_THREADS', '32'))
+GRADIO_CONCURRENCY = int(os.getenv('GRADIO_CONCURRENCY', '256'))
+GRADIO_QUEUE_SIZE = int(os.getenv('GRADIO_QUEUE_SIZE', '1024'))
@@ -0,0 +1,158 @@
+"""Runs the chatbot as one model server and N stateless UI workers behind one port.
+
+Usage:
+    python launch.py --workers 4 --port 7860
+
+The model server loads BLIP, CLIP and Bark once. Each worker is a copy of app.py on its
+own local port that calls the models over IPC and keeps session history in the shared
+state store. The model server listens on a Unix socket in a private directory by default,
+and a fresh MODEL_SERVER_AUTHKEY is generated for every launch. A TCP proxy on --port sends each client to a worker picked by hashing the
+client's address. Stickiness matters because Gradio's queue streams a request's
+progress over the connection that submitted it.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def wait_for_port(address, timeout, process):
+    """Waits until something accepts connections on address, a (host, port) tuple or a Unix
+    socket path, or fails if process exits."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process {process.args} exited with code {process.returncode}")
+        try:
+            if isinstance(address, str):
+                with socket.socket(socket.AF_UNIX) as sock:
+                    sock.settimeout(1)
+                    sock.connect(address)
+            else:
+                with socket.create_connection(address, timeout=1):
+                    pass
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"Nothing listening on {address} after {timeout}s")
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+def sticky_proxy(backends):
+    """Returns a connection handler forwarding each client to a backend chosen by its IP."""
+    async def _handle(client_reader, client_writer):
+        peer = client_writer.get_extra_info("peername") or ("", 0)
+        start = int(hashlib.sha256(peer[0].encode("utf-8")).hexdigest(), 16) % len(backends)
+        # Fall over to the next worker if the preferred one is down
+        for offset in range(len(backends)):
+            host, port = backends[(start + offset) % len(backends)]
+            try:
+                backend_reader, backend_writer = await asyncio.open_connection(host, port)
+                break
+            except OSError:
+                continue
+        else:
+            client_writer.close()
+            return
+        await asyncio.gather(_pipe(client_reader, backend_writer), _pipe(backend_reader, client_writer))
+    return _handle
+
+
+async def serve_proxy(host, port, backends):
+    server = await asyncio.start_server(sticky_proxy(backends), host, port)
+    print(f"Serving {len(backends)} worker(s) on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--worker-base-port", type=int, default=7861)
+    parser.add_argument("--model-server", default=None,
+                        help="host:port or Unix socket path of the model server (default: a private Unix socket)")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    args = parser.parse_args(argv)
+
+    from config import METRICS_PORT
+    from src.model_server import parse_address
+
+    socket_dir = None
+    if args.model_server is None:
+        if hasattr(socket, "AF_UNIX"):
+            # mkdtemp creates the directory readable by this user only
+            socket_dir = tempfile.mkdtemp(prefix="model-server-")
+            args.model_server = os.path.join(socket_dir, "models.sock")
+        else:
+            args.model_server = "127.0.0.1:50051"
+    # Shared only with our own children, through their environment
+    authkey = secrets.token_hex(32)
+
+    processes = []
+    try:
+        server_env = dict(os.environ, MODEL_SERVER_AUTHKEY=authkey)
+        server_env.pop("MODEL_SERVER_ADDRESS", None)
+        model_server = subprocess.Popen(
+            [sys.executable, "-m", "src.model_server", "--address", args.model_server], env=server_env)
+        processes.append(model_server)
+        wait_for_port(parse_address(args.model_server), args.startup_timeout, model_server)
+
+        backends = []
+        for index in range(args.workers):
+            port = args.worker_base_port + index
+            worker_env = dict(
+                os.environ,
+                MODEL_SERVER_ADDRESS=args.model_server,
+                MODEL_SERVER_AUTHKEY=authkey,
+                SESSION_BACKEND="sqlite",
+                GRADIO_SERVER_NAME="127.0.0.1",
+                GRADIO_SERVER_PORT=str(port),
+                # The model server prewarms the models and collects media garbage
+                PREWARM_MODELS="",
+                MEDIA_GC_INTERVAL_SECONDS="0",
+                METRICS_PORT=str(METRICS_PORT + 1 + index) if METRICS_PORT else "0",
+            )
+            processes.append(subprocess.Popen([sys.executable, "app.py"], env=worker_env))
+            backends.append(("127.0.0.1", port))
+        for (host, port), process in zip(backends, processes[1:]):
+            wait_for_port((host, port), args.startup_timeout, process)
+
+        asyncio.run(serve_proxy(args.host, args.port, backends))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if socket_dir is not None:
+            shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import json
+import time
+from transformers import ReactJsonAgent
+from src.clients import request_deadline
+from src.telemetry import metrics
+
+
+class BudgetExhausted(Exception):
+    """Raised inside a run once its deadline has passed or its token budget is spent.
+
+    It is deliberately not an AgentError, so ReactAgent does not log it as a failed step
+    and carry on; the run ends and the best answer so far is returned instead.
+    """
+
+
+class BudgetedReactJsonAgent(ReactJsonAgent):
+    """ReactJsonAgent that enforces what its system prompt only asks for.
+
+    Within a run, a tool call identical to an earlier one (same tool, same arguments)
+    returns the earlier observation without running the tool again. A run can be given
+    a deadline (time.monotonic() value) and a token budget covering prompt and completion
+    tokens; when either runs out, the run stops and the most recent tool observation is
+    returned through final_answer.
+    """
+
+    def __init__(self, *args, count_tokens=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Token counts are approximated by characters / 4 when no tokenizer is given
+        self.count_tokens = count_tokens or (lambda text: len(text) // 4)
+        self._engine = self.llm_engine
+        self.llm_engine = self._metered_llm_call
+        self._reset_budget(None, None)
+
+    def _reset_budget(self, deadline, token_budget):
+        self.deadline = deadline
+        self.tokens_left = token_budget
+        self.tool_cache = {}
+        self.last_observation = None
+        self.exhausted = None
+
+    def run(self, task, stream=False, reset=True, deadline=None, token_budget=None, **kwargs):
+        self._reset_budget(deadline, token_budget)
+        return super().run(task, stream=stream, reset=reset, **kwargs)
+
+    def check_budget(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise BudgetExhausted("Deadline reached")
+        if self.tokens_left is not None and self.tokens_left <= 0:
+            raise BudgetExhausted("Token budget spent")
+
+    def _metered_llm_call(self, messages, *args, **kwargs):
+        try:
+            self.check_budget()
+        except BudgetExhausted as e:
+            # ReactAgent wraps errors from the LLM call in AgentGenerationError; step() and
+            # provide_final_answer() pick this up again from the instance
+            self.exhausted = e
+            raise
+        response = self._engine(messages, *args, **kwargs)
+        if self.tokens_left is not None:
+            used = sum(self.count_tokens(str(message.get("content", ""))) for message in messages)
+            used += self.count_tokens(response)
+            self.tokens_left -= used
+        return response
+
+    def step(self, log_entry):
+        # Checked outside the step's AgentError handling, so running out ends the run
+        self.check_budget()
+        try:
+            return super().step(log_entry)
+        finally:
+            if self.exhausted is not None:
+                raise self.exhausted
+
+    def provide_final_answer(self, task):
+        # Reached at max_iterations; its own LLM call would turn BudgetExhausted into answer text
+        try:
+            self.check_budget()
+            answer = super().provide_final_answer(task)
+        except BudgetExhausted as e:
+            return self.best_answer(e)
+        if self.exhausted is not None:
+            return self.best_answer(self.exhausted)
+        return answer
+
+    def execute_tool_call(self, tool_name, arguments):
+        key = (tool_name, json.dumps(arguments, sort_keys=True, default=str))
+        if key in self.tool_cache:
+            metrics.incr("agent_tool_calls_total", tool=tool_name, result="memoized")
+            return self.tool_cache[key]
+        self.check_budget()
+        observation = super().execute_tool_call(tool_name, arguments)
+        metrics.incr("agent_tool_calls_total", tool=tool_name, result="executed")
+        # Errors are not cached: the model may retry after fixing something else
+        if not (isinstance(observation, str) and observation.startswith("Error")):
+            self.tool_cache[key] = observation
+            self.last_observation = observation
+        return observation
+
+    def best_answer(self, reason):
+        """Returns the answer given when the budget runs out, passed through final_answer."""
+        metrics.incr("agent_budget_exhausted_total", reason=str(reason))
+        if self.last_observation is not None:
+            answer = self.last_observation
+        else:
+            answer = "Sorry, I ran out of time before I could find an answer."
+        return self.toolbox.tools["final_answer"](answer=answer)
+
+    def stream_run(self, task):
+        token = request_deadline.set(self.deadline)
+        try:
+            yield from super().stream_run(task)
+        except BudgetExhausted as e:
+            step_log = {"error": e}
+            self.logs.append(step_log)
+            yield step_log
+            yield self.best_answer(e)
+        finally:
+            request_deadline.reset(token)
+
+    def direct_run(self, task):
+        token = request_deadline.set(self.deadline)
+        try:
+            return super().direct_run(task)
+        except BudgetExhausted as e:
+            self.logs.append({"error": e})
+            return self.best_answer(e)
+        finally:
+            request_deadline.reset(token)
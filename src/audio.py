@@ -0,0 +1,82 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from src.models import model_registry, SAMPLE_RATE
+from src.streaming import emit
+from src.telemetry import metrics, log_payload
+from config import AUDIO_CHUNK_CHARS, AUDIO_WORKERS, AUDIO_VOICE, AUDIO_CHUNK_PAUSE_SECONDS  # Import from config.py
+
+_executor = ThreadPoolExecutor(max_workers=AUDIO_WORKERS, thread_name_prefix="bark")
+
+
+def split_sentences(text, max_chars=AUDIO_CHUNK_CHARS):
+    """Splits text into chunks of whole sentences of at most max_chars characters.
+
+    A sentence longer than max_chars is split between words.
+    """
+    chunks = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?;])\s+", text.strip()):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk]
+
+
+def synthesize_to_file(prompt, path):
+    """Generates speech for prompt chunk by chunk, writing each chunk to path as it is ready.
+
+    The first chunk is generated on its own so audio starts as early as possible; its
+    Bark history (or AUDIO_VOICE, if set) is reused for the remaining chunks so the
+    speaker stays the same, and those are generated in parallel. Every finished chunk
+    is also emitted as an "audio_chunk" event for streaming playback.
+    Returns the time to first audio and the total synthesis time in seconds.
+    """
+    generate_audio = model_registry.get("bark")
+    chunks = split_sentences(prompt) or [prompt]
+    pause = np.zeros(int(AUDIO_CHUNK_PAUSE_SECONDS * SAMPLE_RATE), dtype=np.float32)
+    start = time.perf_counter()
+    time_to_first_audio = None
+
+    with sf.SoundFile(path, mode="w", samplerate=SAMPLE_RATE, channels=1) as out:
+        def _write(index, audio):
+            nonlocal time_to_first_audio
+            audio = np.asarray(audio, dtype=np.float32)
+            if index < len(chunks) - 1:
+                audio = np.concatenate([audio, pause])
+            out.write(audio)
+            out.flush()
+            emit("audio_chunk", index=index, sample_rate=SAMPLE_RATE, audio=audio)
+            if time_to_first_audio is None:
+                time_to_first_audio = time.perf_counter() - start
+
+        history, first_audio = generate_audio(chunks[0], history_prompt=AUDIO_VOICE, output_full=True)
+        _write(0, first_audio)
+
+        voice = AUDIO_VOICE or history
+        futures = [
+            _executor.submit(generate_audio, chunk, history_prompt=voice)
+            for chunk in chunks[1:]
+        ]
+        for index, future in enumerate(futures, start=1):
+            _write(index, future.result())
+
+    total = time.perf_counter() - start
+    metrics.observe("audio_time_to_first_audio_seconds", time_to_first_audio)
+    metrics.observe("audio_synthesis_duration_seconds", total)
+    log_payload("Synthesized %d audio chunk(s): first audio after %.2fs, total %.2fs",
+                len(chunks), time_to_first_audio, total)
+    return {"time_to_first_audio": time_to_first_audio, "total_seconds": total, "chunks": len(chunks)}
@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Collects items submitted from concurrent callers and runs them through batch_fn together.
+
+    The worker waits at most max_wait_ms after the first item of a batch arrives, or
+    until max_batch_size items are queued, so a lone request is delayed by no more
+    than the window. batch_fn receives a list of items and returns one result per item.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._items = 0
+        self._batches = 0
+        self._busy_seconds = 0.0
+
+    def submit(self, item):
+        """Queues item and returns a Future resolved with its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "items": self._items,
+                "batches": self._batches,
+                "mean_batch_size": self._items / self._batches if self._batches else 0.0,
+                "items_per_second": self._items / self._busy_seconds if self._busy_seconds else 0.0,
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            with self._stats_lock:
+                self._items += len(batch)
+                self._batches += 1
+                self._busy_seconds += time.perf_counter() - start
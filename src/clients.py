@@ -0,0 +1,269 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from src.telemetry import metrics
+from config import (  # Import from config.py
+    CLIENT_POOL_SIZE,
+    CLIENT_CONCURRENCY,
+    CLIENT_DEFAULT_CONCURRENCY,
+    CLIENT_DEADLINE_SECONDS,
+    CLIENT_MAX_ATTEMPTS,
+    CLIENT_RESULT_CACHE_SIZE,
+)
+
+# HTTP status codes worth retrying: rate limiting and transient server errors.
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+# Absolute time.monotonic() deadline of the request being processed, e.g. an agent run's.
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def _deadline(explicit, default_seconds):
+    deadline = explicit or time.monotonic() + default_seconds
+    current = request_deadline.get()
+    return min(deadline, current) if current is not None else deadline
+
+
+def configure_http_pool(pool_size):
+    """Makes huggingface_hub reuse keep-alive connections from a pool of pool_size per host."""
+    import requests
+    # Needs huggingface_hub<1.0 (see requirements.txt); 1.x replaced requests with httpx
+    from huggingface_hub import configure_http_backend
+    from requests.adapters import HTTPAdapter
+
+    def _session_factory():
+        session = requests.Session()
+        # Retries are done by ClientLayer, which knows the caller's deadline
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    configure_http_backend(backend_factory=_session_factory)
+
+
+def _retry_after(error):
+    """Returns (retryable, server-requested delay in seconds or None) for an exception."""
+    import requests
+    response = getattr(error, "response", None)
+    # requests/huggingface_hub errors carry response.status_code, aiohttp errors carry status
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    if status is not None:
+        if status not in RETRYABLE_STATUS:
+            return False, None
+        try:
+            return True, float((getattr(error, "headers", None) or response.headers).get("Retry-After"))
+        except (AttributeError, TypeError, ValueError):
+            return True, None
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, TimeoutError, asyncio.TimeoutError)):
+        return True, None
+    try:
+        import aiohttp
+        return isinstance(error, aiohttp.ClientConnectionError), None
+    except ImportError:
+        return False, None
+
+
+class ClientLayer:
+    """Shared gate for calls to remote inference endpoints.
+
+    Each endpoint gets a semaphore capping its concurrent requests. Identical requests
+    in flight at the same time (same endpoint and key) are made once and share the result.
+    Rate-limit and transient errors are retried with jittered exponential backoff, as long
+    as the next attempt can start before the call's deadline. Results of deterministic
+    calls are kept in an LRU cache.
+    """
+
+    def __init__(self, concurrency=None, default_concurrency=4, deadline_seconds=120.0,
+                 max_attempts=4, backoff_seconds=0.5, cache_entries=256):
+        self.concurrency = concurrency or {}
+        self.default_concurrency = default_concurrency
+        self.deadline_seconds = deadline_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.cache_entries = cache_entries
+        self._semaphores = {}
+        self._pending = {}
+        self._async_pending = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _semaphore(self, endpoint):
+        with self._lock:
+            semaphore = self._semaphores.get(endpoint)
+            if semaphore is None:
+                limit = self.concurrency.get(endpoint, self.default_concurrency)
+                semaphore = self._semaphores[endpoint] = threading.BoundedSemaphore(limit)
+            return semaphore
+
+    def call(self, endpoint, key, fn, cacheable=False, deadline=None):
+        """Returns fn() for the request identified by (endpoint, key).
+
+        key must capture everything that determines the response; cacheable marks
+        responses that are safe to reuse after the call finished (e.g. a fixed seed).
+        deadline is an absolute time.monotonic() value, by default deadline_seconds away;
+        it never extends past the current request_deadline.
+        """
+        cache_key = (endpoint, key)
+        with self._lock:
+            if cacheable and cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+                metrics.incr("client_requests_total", endpoint=endpoint, result="cached")
+                return self._cache[cache_key]
+            future = self._pending.get(cache_key)
+            owner = future is None
+            if owner:
+                future = self._pending[cache_key] = Future()
+        if not owner:
+            metrics.incr("client_requests_total", endpoint=endpoint, result="coalesced")
+            return future.result()
+
+        try:
+            result = self._call_with_retries(endpoint, fn, _deadline(deadline, self.deadline_seconds))
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(cache_key, None)
+        if cacheable:
+            with self._lock:
+                self._cache[cache_key] = result
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+        return result
+
+    def _call_with_retries(self, endpoint, fn, deadline):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with self.limit(endpoint, deadline):
+                    result = fn()
+                metrics.incr("client_requests_total", endpoint=endpoint, result="ok")
+                return result
+            except DeadlineExceeded:
+                metrics.incr("client_requests_total", endpoint=endpoint, result="deadline")
+                raise
+            except Exception as e:
+                retryable, retry_after = _retry_after(e)
+                delay = retry_after if retry_after is not None else (
+                    self.backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                if not retryable or attempt == self.max_attempts or time.monotonic() + delay >= deadline:
+                    metrics.incr("client_requests_total", endpoint=endpoint, result="error")
+                    raise
+                metrics.incr("client_retries_total", endpoint=endpoint)
+                time.sleep(delay)
+
+    async def acall(self, endpoint, key, coroutine_fn, cacheable=False, deadline=None):
+        """Async counterpart of call() for coroutine_fn(), awaited on the event loop.
+
+        Async calls share the result cache and the per-endpoint concurrency limit with call().
+        """
+        cache_key = (endpoint, key)
+        with self._lock:
+            if cacheable and cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+                metrics.incr("client_requests_total", endpoint=endpoint, result="cached")
+                return self._cache[cache_key]
+        future = self._async_pending.get(cache_key)
+        if future is not None:
+            metrics.incr("client_requests_total", endpoint=endpoint, result="coalesced")
+            return await asyncio.shield(future)
+        future = self._async_pending[cache_key] = asyncio.get_running_loop().create_future()
+
+        try:
+            result = await self._acall_with_retries(endpoint, coroutine_fn, _deadline(deadline, self.deadline_seconds))
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Marks it retrieved when nobody else was waiting
+            raise
+        finally:
+            self._async_pending.pop(cache_key, None)
+        if cacheable:
+            with self._lock:
+                self._cache[cache_key] = result
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+        return result
+
+    async def _acall_with_retries(self, endpoint, coroutine_fn, deadline):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with self.limit(endpoint, deadline):
+                    result = await coroutine_fn()
+                metrics.incr("client_requests_total", endpoint=endpoint, result="ok")
+                return result
+            except DeadlineExceeded:
+                metrics.incr("client_requests_total", endpoint=endpoint, result="deadline")
+                raise
+            except Exception as e:
+                retryable, retry_after = _retry_after(e)
+                delay = retry_after if retry_after is not None else (
+                    self.backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                if not retryable or attempt == self.max_attempts or time.monotonic() + delay >= deadline:
+                    metrics.incr("client_requests_total", endpoint=endpoint, result="error")
+                    raise
+                metrics.incr("client_retries_total", endpoint=endpoint)
+            await asyncio.sleep(delay)
+
+    def limit(self, endpoint, deadline=None):
+        """Context manager holding one of endpoint's concurrency slots, e.g. for a streamed response.
+
+        Use `async with` on the event loop: the slot then comes from the same semaphore
+        without blocking the loop while waiting for it.
+        """
+        return _Slot(self._semaphore(endpoint), endpoint, _deadline(deadline, self.deadline_seconds))
+
+
+class _Slot:
+    def __init__(self, semaphore, endpoint, deadline):
+        self.semaphore = semaphore
+        self.endpoint = endpoint
+        self.deadline = deadline
+
+    def __enter__(self):
+        start = time.perf_counter()
+        if not self.semaphore.acquire(timeout=max(0.0, self.deadline - time.monotonic())):
+            raise DeadlineExceeded(f"No free {self.endpoint} slot before the deadline")
+        metrics.observe("client_queue_wait_seconds", time.perf_counter() - start, endpoint=self.endpoint)
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+        return False
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        delay = 0.005
+        # Threads block on the semaphore itself; the event loop polls it instead
+        while not self.semaphore.acquire(blocking=False):
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"No free {self.endpoint} slot before the deadline")
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.1)
+        metrics.observe("client_queue_wait_seconds", time.perf_counter() - start, endpoint=self.endpoint)
+        return self
+
+    async def __aexit__(self, *exc):
+        return self.__exit__(*exc)
+
+
+client_layer = ClientLayer(
+    concurrency=CLIENT_CONCURRENCY,
+    default_concurrency=CLIENT_DEFAULT_CONCURRENCY,
+    deadline_seconds=CLIENT_DEADLINE_SECONDS,
+    max_attempts=CLIENT_MAX_ATTEMPTS,
+    cache_entries=CLIENT_RESULT_CACHE_SIZE,
+)
+configure_http_pool(CLIENT_POOL_SIZE)
@@ -0,0 +1,228 @@
+import atexit
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import torch
+from src.inference import image_features, text_features
+from src.media_store import media_store
+from src.model_server import remote_inference
+from config import IMAGE_DIR, IMAGE_INDEX_PATH, TEXT_EMBEDDING_CACHE_SIZE, MODEL_SERVER_ADDRESS  # Import from config.py
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif")
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TextEmbeddingCache:
+    """LRU cache of CLIP text embeddings keyed by the hash of the text."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, texts):
+        """Returns a [len(texts), dim] tensor, encoding only the texts not seen before."""
+        keys = [text_hash(text) for text in texts]
+        with self._lock:
+            missing = [text for key, text in zip(keys, texts) if key not in self._entries]
+        if missing:
+            missing = list(dict.fromkeys(missing))
+            encoded = text_features(missing)
+            with self._lock:
+                for text, embedding in zip(missing, encoded):
+                    self._entries[text_hash(text)] = embedding
+        with self._lock:
+            rows = []
+            for key, text in zip(keys, texts):
+                embedding = self._entries.get(key)
+                if embedding is None:  # evicted by a concurrent caller
+                    embedding = text_features([text])[0]
+                else:
+                    self._entries.move_to_end(key)
+                rows.append(embedding)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return torch.stack(rows)
+
+
+class ImageIndex:
+    """Persistent CLIP embedding index over images, keyed by content hash.
+
+    Embeddings are stored in IMAGE_INDEX_PATH so an image is encoded at most once,
+    across calls and across restarts. Concurrent requests for the same image share
+    one encode. Saves run on the index's background thread after the queued indexing
+    work, so a burst of new images is written once.
+    """
+
+    def __init__(self, path, image_dir):
+        self.path = path
+        self.image_dir = image_dir
+        self._embeddings = {}  # content hash -> embedding
+        self._paths = {}  # content hash -> most recent path with that content
+        self._pending = {}  # content hash -> Future of an in-flight encode
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._save_queued = False
+        self._failed = set()  # paths that could not be encoded
+        self._dir_mtime = None  # image directory mtime at the last sync
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-index")
+        self._load()
+        atexit.register(self.save)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            data = torch.load(self.path)
+            self._embeddings = dict(data["embeddings"])
+            self._paths = dict(data["paths"])
+        except Exception as e:
+            logger.warning("Could not load image index %s: %s", self.path, e)
+
+    def save(self):
+        """Writes the index to disk if it changed since the last save."""
+        with self._lock:
+            self._save_queued = False
+            if not self._dirty:
+                return
+            data = {"embeddings": dict(self._embeddings), "paths": dict(self._paths)}
+            self._dirty = False
+        tmp_path = f"{self.path}.tmp"
+        torch.save(data, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def _schedule_save(self):
+        with self._lock:
+            if self._save_queued:
+                return
+            self._save_queued = True
+        self._executor.submit(self._save_logged)
+
+    def _save_logged(self):
+        try:
+            self.save()
+        except Exception as e:
+            logger.warning("Could not save image index %s: %s", self.path, e)
+
+    def embedding(self, path):
+        """Returns the CLIP embedding of the image at path, indexing it if needed."""
+        digest = media_store.content_hash(path)
+        with self._lock:
+            self._paths[digest] = os.path.abspath(path)
+            if digest in self._embeddings:
+                return self._embeddings[digest]
+            future = self._pending.get(digest)
+            owner = future is None
+            if owner:
+                future = self._pending[digest] = Future()
+
+        if not owner:
+            return future.result()
+        try:
+            embedding = image_features(path)
+            with self._lock:
+                self._embeddings[digest] = embedding
+                self._dirty = True
+            future.set_result(embedding)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+        self._schedule_save()
+        return embedding
+
+    def forget(self, path):
+        """Drops the index entry for a deleted file."""
+        path = os.path.abspath(path)
+        with self._lock:
+            for digest, indexed_path in list(self._paths.items()):
+                if indexed_path == path:
+                    del self._paths[digest]
+                    self._embeddings.pop(digest, None)
+                    self._dirty = True
+            self._failed.discard(path)
+        self._schedule_save()
+
+    def add_async(self, path):
+        """Indexes the image at path in the background."""
+        def _add():
+            try:
+                self.embedding(path)
+            except Exception as e:
+                logger.warning("Could not index image %s: %s", path, e)
+        return self._executor.submit(_add)
+
+    def sync(self):
+        """Indexes images in the image directory that are not in the index yet.
+
+        The directory is only listed again after its mtime changed, and images that
+        failed to encode are not retried.
+        """
+        try:
+            mtime = os.stat(self.image_dir).st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._dir_mtime:
+                return
+            self._dir_mtime = mtime
+            known = set(self._paths.values()) | self._failed
+        for filename in sorted(os.listdir(self.image_dir)):
+            path = os.path.abspath(os.path.join(self.image_dir, filename))
+            if filename.lower().endswith(IMAGE_EXTENSIONS) and path not in known:
+                try:
+                    self.embedding(path)
+                except Exception as e:
+                    with self._lock:
+                        self._failed.add(path)
+                    logger.warning("Could not index image %s: %s", path, e)
+
+    def search(self, query, top_k=1):
+        """Returns up to top_k (path, cosine similarity) pairs best matching the query."""
+        self.sync()
+        with self._lock:
+            items = [
+                (self._paths[digest], embedding)
+                for digest, embedding in self._embeddings.items()
+                if digest in self._paths and os.path.exists(self._paths[digest])
+            ]
+        if not items:
+            return []
+        query_embedding = text_embeddings.get([query])[0]
+        scores = torch.stack([embedding for _, embedding in items]) @ query_embedding
+        best = scores.topk(min(top_k, len(items)))
+        return [(items[i][0], score) for score, i in zip(best.values.tolist(), best.indices.tolist())]
+
+
+class RemoteImageIndex:
+    """ImageIndex interface backed by the model server's index, so all workers share one index."""
+
+    def embedding(self, path):
+        return remote_inference().index_embedding(os.path.abspath(path))
+
+    def add_async(self, path):
+        remote_inference().index_add(os.path.abspath(path))
+
+    def forget(self, path):
+        remote_inference().index_forget(os.path.abspath(path))
+
+    def search(self, query, top_k=1):
+        return remote_inference().index_search(query, top_k)
+
+
+text_embeddings = TextEmbeddingCache(TEXT_EMBEDDING_CACHE_SIZE)
+if MODEL_SERVER_ADDRESS:
+    image_index = RemoteImageIndex()
+else:
+    image_index = ImageIndex(IMAGE_INDEX_PATH, IMAGE_DIR)
+    media_store.on_delete.append(image_index.forget)
@@ -0,0 +1,21 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from config import INFERENCE_THREADS, AGENT_THREADS  # Import from config.py
+
+# Local BLIP, CLIP and Bark work: one thread per core, so async handlers never oversubscribe the CPU.
+cpu_executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS or os.cpu_count() or 1, thread_name_prefix="inference")
+
+# ReactJsonAgent runs are synchronous and mostly wait on the LLM endpoint; requests beyond
+# AGENT_THREADS wait in this executor's queue rather than holding a server thread each.
+agent_executor = ThreadPoolExecutor(max_workers=AGENT_THREADS, thread_name_prefix="agent")
+
+
+async def run_in(executor, fn, *args, **kwargs):
+    """Awaits fn(*args, **kwargs) on executor (None: the loop's default executor, for
+    blocking I/O), carrying over the caller's context variables."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
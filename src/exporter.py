@@ -0,0 +1,215 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from src.telemetry import metrics
+from config import (  # Import from config.py
+    EXPORT_QUEUE_SIZE,
+    EXPORT_BATCH_SIZE,
+    EXPORT_FLUSH_SECONDS,
+    EXPORT_SPOOL_DIR,
+    EXPORT_REPLAY_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FeedbackExporter:
+    """Sends feedback and run metadata from a background thread, off the request path.
+
+    submit() only enqueues. The worker thread sends items in batches of up to batch_size,
+    at least every flush_seconds. Items that fail to send, or that arrive while the queue
+    is full, are appended to a JSONL spool in spool_dir. The spool is replayed every
+    replay_seconds, so nothing is lost while the backend is slow or down. Every item
+    carries a feedback_id, so a replayed item is never recorded twice.
+    """
+
+    def __init__(self, sender, spool_dir, max_queue=1000, batch_size=50, flush_seconds=2.0, replay_seconds=60.0):
+        self.sender = sender
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.replay_seconds = replay_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spool_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+        atexit.register(self.close)
+
+    def submit(self, run_id, key, **fields):
+        """Queues feedback `key` for run_id; fields are passed to the sender (score, value, comment)."""
+        item = {"run_id": str(run_id), "key": key, "feedback_id": str(uuid.uuid4()), **fields}
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            metrics.incr("export_items_total", result="spooled_full")
+            self._spool([item])
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="feedback-exporter", daemon=True)
+                self._thread.start()
+
+    def start(self):
+        """Starts the worker thread, which first replays what earlier processes left in the spool."""
+        self._ensure_started()
+
+    def _run(self):
+        self.replay()
+        last_replay = time.monotonic()
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+            if time.monotonic() - last_replay >= self.replay_seconds:
+                last_replay = time.monotonic()
+                self.replay()
+
+    def _next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, items):
+        """Sends items, spooling the ones that fail. Returns the number sent."""
+        failed = []
+        for index, item in enumerate(items):
+            try:
+                self.sender(**item)
+                metrics.incr("export_items_total", result="sent")
+            except Exception as e:
+                if _already_recorded(e):
+                    continue
+                logger.warning("Feedback export failed, spooling %d item(s): %s", len(items) - index, e)
+                # The backend is most likely down; don't wait on a timeout for every item
+                failed = items[index:]
+                break
+        if failed:
+            metrics.incr("export_items_total", len(failed), result="spooled")
+            self._spool(failed)
+        return len(items) - len(failed)
+
+    def _spool(self, items):
+        path = os.path.join(self.spool_dir, f"spool-{os.getpid()}.jsonl")
+        with self._spool_lock, open(path, "a") as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+
+    def replay(self):
+        """Resends spooled items. Each file is claimed by renaming it, so workers don't replay it twice.
+
+        A claimed file is removed only once its items were sent or spooled again, and files
+        left claimed by a worker that died are picked up again.
+        """
+        for path in self._replayable():
+            base = path.split(".jsonl")[0] + ".jsonl"
+            claimed = f"{base}.{os.getpid()}.replaying"
+            try:
+                with self._spool_lock:
+                    os.rename(path, claimed)
+            except OSError:
+                continue  # Claimed by another worker
+            with open(claimed) as f:
+                items = []
+                for line in f:
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        continue
+            sent = 0
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                sent += self._send(batch)
+                if sent < start + len(batch):
+                    # Still failing: put the rest back without retrying it now
+                    self._spool(items[start + self.batch_size:])
+                    break
+            os.remove(claimed)
+            metrics.incr("export_items_total", sent, result="replayed")
+
+    def _replayable(self):
+        paths = sorted(glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl")))
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl.*.replaying"))):
+            try:
+                owner = int(path.rsplit(".", 2)[1])
+            except ValueError:
+                continue
+            # Only this thread replays in this process, so a claim of ours is left over too
+            if owner == os.getpid() or not _process_alive(owner):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        """Spools whatever is still queued, e.g. at interpreter exit."""
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if items:
+            self._spool(items)
+
+    def spooled_count(self):
+        count = 0
+        for path in glob.glob(os.path.join(self.spool_dir, "spool-*.jsonl")):
+            with open(path) as f:
+                count += sum(1 for _ in f)
+        return count
+
+
+def _already_recorded(error):
+    # A replayed feedback_id that already reached the backend is reported as a conflict
+    try:
+        from langsmith.utils import LangSmithConflictError
+    except ImportError:
+        LangSmithConflictError = ()
+    return (isinstance(error, LangSmithConflictError)
+            or getattr(getattr(error, "response", None), "status_code", None) == 409)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists, owned by someone else
+    return True
+
+
+def _create_feedback(**item):
+    from langsmith import Client
+    global _client
+    if _client is None:
+        _client = Client()
+    _client.create_feedback(**item)
+
+
+_client = None
+
+feedback_exporter = FeedbackExporter(
+    _create_feedback,
+    EXPORT_SPOOL_DIR,
+    max_queue=EXPORT_QUEUE_SIZE,
+    batch_size=EXPORT_BATCH_SIZE,
+    flush_seconds=EXPORT_FLUSH_SECONDS,
+    replay_seconds=EXPORT_REPLAY_SECONDS,
+)
+metrics.add_collector(lambda: [("export_queue_size", {}, feedback_exporter._queue.qsize())])
@@ -0,0 +1,74 @@
+import torch
+from src.batching import MicroBatcher
+from src.models import model_registry
+from src.preprocess import preprocess_cache
+from src.telemetry import metrics, span
+from src.model_server import remote_inference
+from config import BATCH_MAX_SIZE, BATCH_WINDOW_MS, MODEL_SERVER_ADDRESS  # Import from config.py
+
+
+def _caption_batch(pixel_values):
+    """Captions a list of [1, 3, H, W] BLIP pixel tensors with one generate call."""
+    blip_processor, blip_model = model_registry.get("blip")
+    metrics.incr("model_batch_items_total", len(pixel_values), model="blip")
+    with span("model_batch", model="blip"), torch.inference_mode():
+        out = blip_model.generate(pixel_values=torch.cat(pixel_values))
+    return blip_processor.batch_decode(out, skip_special_tokens=True)
+
+
+def _image_features_batch(pixel_values):
+    """Returns L2-normalised CLIP image embeddings for a list of [1, 3, H, W] CLIP pixel tensors."""
+    _, clip_model = model_registry.get("clip")
+    metrics.incr("model_batch_items_total", len(pixel_values), model="clip")
+    with span("model_batch", model="clip"), torch.inference_mode():
+        features = clip_model.get_image_features(pixel_values=torch.cat(pixel_values))
+    features = torch.nn.functional.normalize(features, dim=-1)
+    return list(features)
+
+
+caption_batcher = MicroBatcher(_caption_batch, BATCH_MAX_SIZE, BATCH_WINDOW_MS, name="blip-batcher")
+clip_batcher = MicroBatcher(_image_features_batch, BATCH_MAX_SIZE, BATCH_WINDOW_MS, name="clip-batcher")
+
+
+def _batcher_gauges():
+    for model, batcher in (("blip", caption_batcher), ("clip", clip_batcher)):
+        stats = batcher.stats()
+        yield "model_batch_mean_size", {"model": model}, stats["mean_batch_size"]
+        yield "model_batch_items_per_second", {"model": model}, stats["items_per_second"]
+
+
+metrics.add_collector(_batcher_gauges)
+
+
+def caption_image(image_path):
+    """Returns the BLIP caption for the image at image_path."""
+    if MODEL_SERVER_ADDRESS:
+        return remote_inference().caption_image(image_path)
+    return caption_batcher(preprocess_cache.pixel_values(image_path, "blip"))
+
+
+def image_features(image_path):
+    """Returns the normalised CLIP embedding of the image at image_path."""
+    if MODEL_SERVER_ADDRESS:
+        return remote_inference().image_features(image_path)
+    return clip_batcher(preprocess_cache.pixel_values(image_path, "clip"))
+
+
+def text_features(texts):
+    """Returns normalised CLIP embeddings for a list of texts as one tensor."""
+    if MODEL_SERVER_ADDRESS:
+        return remote_inference().text_features(list(texts))
+    clip_processor, clip_model = model_registry.get("clip")
+    # CLIP's text encoder takes at most 77 tokens
+    inputs = clip_processor(text=list(texts), return_tensors="pt", padding=True, truncation=True)
+    with torch.inference_mode():
+        features = clip_model.get_text_features(**inputs)
+    return torch.nn.functional.normalize(features, dim=-1)
+
+
+def clip_logit_scale():
+    """Returns the temperature CLIP applies to cosine similarities before the softmax."""
+    if MODEL_SERVER_ADDRESS:
+        return remote_inference().clip_logit_scale()
+    _, clip_model = model_registry.get("clip")
+    return clip_model.logit_scale.exp().item()
@@ -0,0 +1,139 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from transformers import TextStreamer
+from transformers.agents.llm_engine import get_clean_message_list, llama_role_conversions
+from src.streaming import FinalAnswerExtractor, emit, event_sink
+from src.telemetry import metrics, span
+
+
+class _EventStreamer(TextStreamer):
+    """Emits newly decoded text as "llm_token" and "answer_token" events while generate runs."""
+
+    def __init__(self, tokenizer):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.extractor = FinalAnswerExtractor()
+
+    def on_finalized_text(self, text, stream_end=False):
+        if not text:
+            return
+        emit("llm_token", text=text)
+        answer = self.extractor.feed(text)
+        if answer:
+            emit("answer_token", text=answer)
+
+
+class PrefixCache:
+    """Keeps the KV caches of the most recent prompts so a new prompt only computes its new tokens.
+
+    Agent prompts share the system prompt across runs and grow by one step per iteration
+    within a run, so the cache of the longest matching earlier prompt covers most of the
+    next one.
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # tuple(token_ids) -> DynamicCache
+        self._lock = threading.Lock()
+
+    def lookup(self, token_ids):
+        """Returns (reused_length, cache) for the entry sharing the longest prefix with token_ids.
+
+        The cache is a cropped copy, so the stored entry stays intact. Returns (0, None) if
+        nothing matches.
+        """
+        with self._lock:
+            best_key, best_length = None, 0
+            for key in self._entries:
+                length = _common_prefix_length(key, token_ids)
+                if length > best_length:
+                    best_key, best_length = key, length
+            if best_key is None:
+                return 0, None
+            self._entries.move_to_end(best_key)
+            cache = self._entries[best_key]
+        # At least one token must be left for the model to compute the next logits from
+        best_length = min(best_length, len(token_ids) - 1)
+        if best_length <= 0:
+            return 0, None
+        cache = copy.deepcopy(cache)
+        cache.crop(best_length)
+        return best_length, cache
+
+    def store(self, token_ids, cache):
+        with self._lock:
+            key = tuple(token_ids)
+            # An entry that is a prefix of the new one is superseded by it
+            for existing in [k for k in self._entries if len(k) <= len(key) and key[:len(k)] == k]:
+                del self._entries[existing]
+            self._entries[key] = cache
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _common_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class LocalTransformersEngine:
+    """Runs a small chat model on the CPU in-process, with the same call signature as HfApiEngine.
+
+    The KV cache of each prompt plus its completion is kept in a PrefixCache, so the static
+    system prompt and the growing transcript of a run are not recomputed on every agent
+    iteration. Needs no network access once the model is downloaded.
+    """
+
+    def __init__(self, model_loader, max_new_tokens=512, prefix_cache_entries=4):
+        self.model_loader = model_loader
+        self.max_new_tokens = max_new_tokens
+        self.prefix_cache = PrefixCache(prefix_cache_entries)
+        # One CPU model: concurrent generations would only compete for the same cores
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, stop_sequences=[], grammar=None) -> str:
+        import torch
+        from transformers import DynamicCache
+
+        tokenizer, model = self.model_loader()
+        messages = get_clean_message_list(messages, role_conversions=llama_role_conversions)
+        input_ids = tokenizer.apply_chat_template(messages, add_generation_prompt=True, return_tensors="pt")
+        prompt_ids = input_ids[0].tolist()
+
+        with self._lock, span("llm_generate", backend="local"), torch.inference_mode():
+            reused, cache = self.prefix_cache.lookup(prompt_ids)
+            if cache is None:
+                cache = DynamicCache()
+            start = time.perf_counter()
+            output = model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=cache,
+                max_new_tokens=self.max_new_tokens,
+                do_sample=False,
+                stop_strings=list(stop_sequences) or None,
+                tokenizer=tokenizer,
+                streamer=_EventStreamer(tokenizer) if event_sink.get() is not None else None,
+                pad_token_id=tokenizer.pad_token_id or tokenizer.eos_token_id,
+            )
+            elapsed = time.perf_counter() - start
+            output_ids = output[0].tolist()
+            self.prefix_cache.store(output_ids[:cache.get_seq_length()], cache)
+
+        completion_ids = output_ids[len(prompt_ids):]
+        metrics.incr("llm_tokens_total", len(prompt_ids), kind="prompt")
+        metrics.incr("llm_tokens_total", reused, kind="prompt_cached")
+        metrics.incr("llm_tokens_total", len(completion_ids), kind="completion")
+        if completion_ids:
+            metrics.observe("llm_seconds_per_output_token", elapsed / len(completion_ids), backend="local")
+
+        response = tokenizer.decode(completion_ids, skip_special_tokens=True)
+        for stop_seq in stop_sequences:
+            if stop_seq in response:
+                response = response[:response.index(stop_seq)]
+        return response
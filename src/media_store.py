@@ -0,0 +1,193 @@
+import hashlib
+import io
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from PIL import Image
+from config import (  # Import from config.py
+    IMAGE_DIR,
+    AUDIO_DIR,
+    VARIANT_DIR,
+    MEDIA_MAX_BYTES,
+    MEDIA_MAX_AGE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Longest shorter side kept in the model-ready variant; BLIP works at 384px and CLIP at 224px.
+MODEL_IMAGE_SIZE = 384
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    """Content-addressed store for images and audio.
+
+    Files are named after the hash of their contents, so identical uploads are kept
+    once and files created in the same second never overwrite each other. Derived
+    variants (e.g. a downscaled RGB copy for the vision models) are cached next to
+    them. A background collector deletes files older than max_age_seconds and then the
+    oldest files until everything fits in max_bytes.
+    """
+
+    def __init__(self, dirs, variant_dir, max_bytes=None, max_age_seconds=None):
+        self.dirs = dirs
+        self.variant_dir = variant_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._gc_thread = None
+        self.on_delete = []  # callbacks receiving the path of each collected file
+        self._hashes = OrderedDict()  # (path, mtime, size) -> content hash
+        os.makedirs(variant_dir, exist_ok=True)
+
+    def content_hash(self, path):
+        """Returns the sha256 of the file at path, reading it only when it changed."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._hashes.get(key)
+            if digest is not None:
+                self._hashes.move_to_end(key)
+                return digest
+        digest = _sha256_file(path)
+        with self._lock:
+            self._hashes[key] = digest
+            while len(self._hashes) > 4096:
+                self._hashes.popitem(last=False)
+        return digest
+
+    def _stored_path(self, kind, prefix, digest, ext):
+        return os.path.join(self.dirs[kind], f"{prefix}_{digest[:16]}{ext.lower()}")
+
+    def put_file(self, path, kind="image", prefix="uploaded"):
+        """Stores an already-saved file without re-encoding it and returns the stored path."""
+        digest = self.content_hash(path)
+        ext = os.path.splitext(path)[1] or ".bin"
+        dest = self._stored_path(kind, prefix, digest, ext)
+        with self._lock:
+            if os.path.exists(dest):
+                os.utime(dest)
+                return dest
+            tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+            try:
+                os.link(path, tmp)
+            except OSError:
+                shutil.copyfile(path, tmp)
+            os.replace(tmp, dest)
+        return dest
+
+    def put_image(self, image, prefix="generated_image"):
+        """Encodes a PIL image as PNG, stores it and returns the stored path."""
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        data = buffer.getvalue()
+        dest = self._stored_path("image", prefix, hashlib.sha256(data).hexdigest(), ".png")
+        with self._lock:
+            if os.path.exists(dest):
+                os.utime(dest)
+                return dest
+            tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, dest)
+        return dest
+
+    def allocate(self, kind, prefix, ext):
+        """Returns a fresh, collision-free path for a file that is written incrementally."""
+        return os.path.join(self.dirs[kind], f"{prefix}_{uuid.uuid4().hex[:16]}{ext}")
+
+    def variant(self, path, name, builder):
+        """Returns a cached derived image of the file at path, building it on first use.
+
+        builder receives the decoded PIL image and returns the variant image.
+        """
+        digest = self.content_hash(path)
+        variant_path = os.path.join(self.variant_dir, f"{digest}_{name}.png")
+        if os.path.exists(variant_path):
+            try:
+                image = Image.open(variant_path)
+                image.load()
+                return image
+            except OSError:
+                pass
+        with Image.open(path) as source:
+            image = builder(source)
+        tmp = f"{variant_path}.{uuid.uuid4().hex}.tmp"
+        image.save(tmp, format="PNG")
+        os.replace(tmp, variant_path)
+        return image
+
+    def model_image(self, path):
+        """Returns the image at path as RGB with its shorter side at most MODEL_IMAGE_SIZE."""
+        def _build(image):
+            image = image.convert("RGB")
+            scale = MODEL_IMAGE_SIZE / min(image.size)
+            if scale < 1:
+                image = image.resize((round(image.width * scale), round(image.height * scale)), Image.BICUBIC)
+            return image
+        return self.variant(path, f"rgb{MODEL_IMAGE_SIZE}", _build)
+
+    def _files(self):
+        for directory in list(self.dirs.values()) + [self.variant_dir]:
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.startswith("."):
+                    yield entry.path, entry.stat()
+
+    def collect_garbage(self):
+        """Deletes expired files, then the oldest ones until the store fits in max_bytes."""
+        now = time.time()
+        files = sorted(self._files(), key=lambda item: item[1].st_mtime)
+        total = sum(stat.st_size for _, stat in files)
+        removed = 0
+        for path, stat in files:
+            expired = self.max_age_seconds and now - stat.st_mtime > self.max_age_seconds
+            over_budget = self.max_bytes and total > self.max_bytes
+            if not (expired or over_budget):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= stat.st_size
+            removed += 1
+            for callback in self.on_delete:
+                callback(path)
+        if removed:
+            logger.info("Media store removed %d file(s), %.1f MB remain", removed, total / (1024 * 1024))
+        return removed
+
+    def start_gc(self, interval_seconds):
+        """Runs the garbage collector every interval_seconds in a background thread."""
+        if self._gc_thread is not None:
+            return self._gc_thread
+
+        def _run():
+            while True:
+                try:
+                    self.collect_garbage()
+                except Exception as e:
+                    logger.warning("Media store garbage collection failed: %s", e)
+                time.sleep(interval_seconds)
+
+        self._gc_thread = threading.Thread(target=_run, name="media-gc", daemon=True)
+        self._gc_thread.start()
+        return self._gc_thread
+
+
+media_store = MediaStore(
+    {"image": IMAGE_DIR, "audio": AUDIO_DIR},
+    VARIANT_DIR,
+    max_bytes=MEDIA_MAX_BYTES,
+    max_age_seconds=MEDIA_MAX_AGE_SECONDS,
+)
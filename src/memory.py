@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)  # (text, token_count)
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class ConversationStore:
+    """Bounded per-session conversation history.
+
+    Each session keeps at most max_turns turns, each truncated to max_context_tokens,
+    so memory per session is constant. Sessions idle for longer than idle_ttl_seconds
+    are dropped. Token counts come from the LLM tokenizer returned by tokenizer_loader;
+    if it cannot be loaded, whitespace-separated words are counted instead.
+    """
+
+    def __init__(self, max_turns=20, max_context_tokens=256, idle_ttl_seconds=3600, tokenizer_loader=None):
+        self.max_turns = max_turns
+        self.max_context_tokens = max_context_tokens
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.tokenizer_loader = tokenizer_loader
+        self._tokenizer = None
+        self._tokenizer_failed = False
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _get_tokenizer(self):
+        if self._tokenizer is None and not self._tokenizer_failed and self.tokenizer_loader is not None:
+            try:
+                self._tokenizer = self.tokenizer_loader()
+            except Exception as e:
+                self._tokenizer_failed = True
+                logger.warning("Falling back to word counts, tokenizer unavailable: %s", e)
+        return self._tokenizer
+
+    def _tail(self, text, max_tokens):
+        """Returns the last max_tokens tokens of text and their count."""
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            words = text.split(" ")
+            if len(words) <= max_tokens:
+                return text, len(words)
+            return " ".join(words[-max_tokens:]), max_tokens
+        ids = tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= max_tokens:
+            return text, len(ids)
+        return tokenizer.decode(ids[-max_tokens:]), max_tokens
+
+    def _session(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep > min(self.idle_ttl_seconds, 60):
+                self._sweep_locked(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.max_turns)
+            session.last_access = now
+            return session
+
+    def _sweep_locked(self, now):
+        self._last_sweep = now
+        idle = [sid for sid, s in self._sessions.items() if now - s.last_access > self.idle_ttl_seconds]
+        for sid in idle:
+            del self._sessions[sid]
+
+    def add_turn(self, session_id, role, content):
+        """Appends a turn to the session, truncated to the context token budget."""
+        text, count = self._tail(f"{role}: {content}", self.max_context_tokens)
+        session = self._session(session_id)
+        with session.lock:
+            session.turns.append((text, count))
+
+    def _turns(self, session_id):
+        session = self._session(session_id)
+        with session.lock:
+            return list(session.turns)
+
+    def context(self, session_id):
+        """Returns the most recent turns of the session that fit in max_context_tokens."""
+        turns = self._turns(session_id)
+        selected = []
+        remaining = self.max_context_tokens
+        for text, count in reversed(turns):
+            if count > remaining:
+                if remaining > 0:
+                    selected.append(self._tail(text, remaining)[0])
+                break
+            selected.append(text)
+            remaining -= count
+        return "\n".join(reversed(selected))
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def session_count(self):
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,123 @@
+"""Model-serving process shared by the UI workers.
+
+Run with `MODEL_SERVER_AUTHKEY=<secret> python -m src.model_server --address /tmp/models.sock`.
+BLIP, CLIP and Bark are loaded once in this process, together with the CLIP image index;
+workers started with MODEL_SERVER_ADDRESS and the same MODEL_SERVER_AUTHKEY call them over
+a local socket. The address is a Unix socket path, or host:port for TCP.
+Each worker connection is served on its own thread, so concurrent requests from all
+workers meet in the same micro-batchers.
+"""
+import argparse
+import logging
+import threading
+from multiprocessing.managers import BaseManager
+from config import MODEL_SERVER_ADDRESS, MODEL_SERVER_AUTHKEY  # Import from config.py
+
+
+def parse_address(address):
+    """Returns a Unix socket path unchanged and splits host:port into a (host, port) tuple."""
+    if "/" in address:
+        return address
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _authkey():
+    # Connections are unpickled, so anyone holding the key can run code in the server
+    if not MODEL_SERVER_AUTHKEY:
+        raise RuntimeError("MODEL_SERVER_AUTHKEY must be set to use the model server")
+    return MODEL_SERVER_AUTHKEY.encode("utf-8")
+
+
+class InferenceService:
+    """The model calls served to workers; runs in the model-serving process."""
+
+    def caption_image(self, image_path):
+        from src.inference import caption_image
+        return caption_image(image_path)
+
+    def image_features(self, image_path):
+        from src.inference import image_features
+        return image_features(image_path)
+
+    def text_features(self, texts):
+        from src.inference import text_features
+        return text_features(texts)
+
+    def clip_logit_scale(self):
+        from src.inference import clip_logit_scale
+        return clip_logit_scale()
+
+    def index_embedding(self, path):
+        from src.embeddings import image_index
+        return image_index.embedding(path)
+
+    def index_add(self, path):
+        from src.embeddings import image_index
+        image_index.add_async(path)
+
+    def index_forget(self, path):
+        from src.embeddings import image_index
+        image_index.forget(path)
+
+    def index_search(self, query, top_k=1):
+        from src.embeddings import image_index
+        return image_index.search(query, top_k)
+
+    def generate_audio(self, text, **kwargs):
+        from src.models import model_registry
+        return model_registry.get("bark")(text, **kwargs)
+
+
+class ModelServerManager(BaseManager):
+    pass
+
+
+_service = InferenceService()
+ModelServerManager.register("inference", callable=lambda: _service)
+
+_remote = None
+_remote_lock = threading.Lock()
+
+
+def remote_inference():
+    """Returns a proxy to the model server's InferenceService, connecting on first use.
+
+    The proxy opens one connection per calling thread, so it is safe to share.
+    """
+    global _remote
+    with _remote_lock:
+        if _remote is None:
+            manager = ModelServerManager(parse_address(MODEL_SERVER_ADDRESS), _authkey())
+            manager.connect()
+            _remote = manager.inference()
+        return _remote
+
+
+def serve(address):
+    authkey = _authkey()
+    from src.models import model_registry
+    from src.media_store import media_store
+    from src.telemetry import start_metrics_server
+    from config import PREWARM_MODELS, MEDIA_GC_INTERVAL_SECONDS, METRICS_PORT
+
+    if PREWARM_MODELS:
+        model_registry.prewarm(PREWARM_MODELS)
+    # This process owns the media garbage collection for all workers
+    if MEDIA_GC_INTERVAL_SECONDS:
+        media_store.start_gc(MEDIA_GC_INTERVAL_SECONDS)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
+    manager = ModelServerManager(parse_address(address), authkey)
+    server = manager.get_server()
+    print(f"Model server listening on {address}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve BLIP, CLIP and Bark to the UI workers.")
+    # Not read from MODEL_SERVER_ADDRESS: setting that makes a process a client of the server
+    parser.add_argument("--address", default="127.0.0.1:50051", help="host:port or a Unix socket path")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    serve(parser.parse_args().address)
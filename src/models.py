@@ -1,27 +1,147 @@
-import os
-from transformers import BlipProcessor, BlipForConditionalGeneration, CLIPProcessor, CLIPModel
 from huggingface_hub import InferenceClient
-from transformers.agents import HfApiEngine
 from langchain_community.utilities import WikipediaAPIWrapper
-from bark import generate_audio, SAMPLE_RATE  # Correct placement at the top
-from config import HF_TOKEN  # Import HF_TOKEN from config.py
+from bark import SAMPLE_RATE
+from config import (  # Import from config.py
+    HF_TOKEN,
+    MODEL_MEMORY_BUDGET_MB,
+    LLM_BACKEND,
+    LOCAL_LLM_MODEL_ID,
+    LOCAL_LLM_QUANTIZE,
+    LOCAL_LLM_MAX_NEW_TOKENS,
+    LLM_PREFIX_CACHE_ENTRIES,
+    VISION_RUNTIME,
+    TORCH_NUM_THREADS,
+    ONNX_DIR,
+    CLIENT_TIMEOUT_SECONDS,
+    MODEL_SERVER_ADDRESS,
+)
+from src.registry import ModelRegistry, estimate_bytes
+from src.streaming import StreamingHfApiEngine
+from src.local_llm import LocalTransformersEngine
+from src.vision_runtime import apply_runtime, quantize_int8
+from src.telemetry import metrics
 
-# Initialize models
-blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+# LLM backends: each builds a callable engine(messages, stop_sequences=[], grammar=None) -> str,
+# the interface ReactJsonAgent and the tools call.
+LLM_BACKENDS = {
+    "hf": lambda: StreamingHfApiEngine(model=LLM_MODEL_ID),
+    "local": lambda: LocalTransformersEngine(
+        lambda: model_registry.get("llm_local"),
+        max_new_tokens=LOCAL_LLM_MAX_NEW_TOKENS,
+        prefix_cache_entries=LLM_PREFIX_CACHE_ENTRIES,
+    ),
+}
 
-client_sd = InferenceClient(
-    model="stabilityai/stable-diffusion-xl-base-1.0",
-    token=HF_TOKEN  # Use HF_TOKEN from config.py
-)
-clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
+LLM_MODEL_ID = LOCAL_LLM_MODEL_ID if LLM_BACKEND == "local" else "meta-llama/Meta-Llama-3-8B-Instruct"
 
-client_audio = InferenceClient(
-    model="suno/bark",
-    token=HF_TOKEN  # Use HF_TOKEN from config.py
-)
+if TORCH_NUM_THREADS:
+    import torch
+    torch.set_num_threads(TORCH_NUM_THREADS)
+
+# Models are loaded by the registry the first time a tool asks for them.
+model_registry = ModelRegistry(memory_budget_mb=MODEL_MEMORY_BUDGET_MB)
+
+
+def _load_blip(runtime=VISION_RUNTIME):
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
+    blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+    blip_model.eval()
+    return blip_processor, apply_runtime(blip_model, "blip", runtime, ONNX_DIR, TORCH_NUM_THREADS)
+
+
+def _load_clip(runtime=VISION_RUNTIME):
+    from transformers import CLIPProcessor, CLIPModel
+    clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
+    clip_model.eval()
+    return clip_processor, apply_runtime(clip_model, "clip", runtime, ONNX_DIR, TORCH_NUM_THREADS)
+
+
+def _load_bark():
+    from bark import generate_audio
+    from bark.generation import preload_models
+    preload_models()
+    return generate_audio
+
+
+def _unload_bark(_):
+    from bark.generation import clean_models
+    clean_models()
+
+
+def _bark_size(_):
+    from bark.generation import models
+    return estimate_bytes(models)
+
+
+def _load_llm_tokenizer():
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(LLM_MODEL_ID, token=HF_TOKEN)
+
+
+def _load_llm_local():
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    tokenizer = AutoTokenizer.from_pretrained(LOCAL_LLM_MODEL_ID, token=HF_TOKEN)
+    model = AutoModelForCausalLM.from_pretrained(LOCAL_LLM_MODEL_ID, token=HF_TOKEN, torch_dtype=torch.float32)
+    model.eval()
+    if LOCAL_LLM_QUANTIZE:
+        model = quantize_int8(model)
+    return tokenizer, model
+
+
+def _load_client_sd():
+    return InferenceClient(
+        model="stabilityai/stable-diffusion-xl-base-1.0",
+        token=HF_TOKEN,  # Use HF_TOKEN from config.py
+        timeout=CLIENT_TIMEOUT_SECONDS,
+    )
+
+
+def _load_client_sd_async():
+    from huggingface_hub import AsyncInferenceClient
+    return AsyncInferenceClient(
+        model="stabilityai/stable-diffusion-xl-base-1.0",
+        token=HF_TOKEN,  # Use HF_TOKEN from config.py
+        timeout=CLIENT_TIMEOUT_SECONDS,
+    )
+
+
+def _load_client_audio():
+    return InferenceClient(
+        model="suno/bark",
+        token=HF_TOKEN,  # Use HF_TOKEN from config.py
+        timeout=CLIENT_TIMEOUT_SECONDS,
+    )
+
+
+def _registry_gauges():
+    for name, stats in model_registry.stats().items():
+        yield "model_loaded", {"model": name}, int(stats["loaded"])
+        yield "model_resident_mb", {"model": name}, stats["resident_mb"]
+        if stats["load_seconds"] is not None:
+            yield "model_load_seconds", {"model": name}, stats["load_seconds"]
+
+
+metrics.add_collector(_registry_gauges)
+
+model_registry.register("blip", _load_blip)
+model_registry.register("clip", _load_clip)
+if MODEL_SERVER_ADDRESS:
+    # Bark runs in the model server; audio.py calls it chunk by chunk through the proxy
+    from src.model_server import remote_inference
+    model_registry.register("bark", lambda: remote_inference().generate_audio, sizer=lambda _: 0)
+else:
+    model_registry.register("bark", _load_bark, unloader=_unload_bark, sizer=_bark_size)
+model_registry.register("llm_tokenizer", _load_llm_tokenizer)
+model_registry.register("llm_local", _load_llm_local)
+model_registry.register("client_sd", _load_client_sd)
+model_registry.register("client_sd_async", _load_client_sd_async)
+model_registry.register("client_audio", _load_client_audio)
 
-llm_engine = HfApiEngine(model="meta-llama/Meta-Llama-3-8B-Instruct")
+if LLM_BACKEND not in LLM_BACKENDS:
+    raise ValueError(f"Unknown LLM_BACKEND '{LLM_BACKEND}', expected one of: {', '.join(LLM_BACKENDS)}")
+llm_engine = LLM_BACKENDS[LLM_BACKEND]()
 
 wiki_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=300)
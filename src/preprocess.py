@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from src.media_store import media_store
+from src.models import model_registry
+from src.utils import load_model_image
+from src.telemetry import metrics
+from config import PREPROCESS_CACHE_IMAGES, PREPROCESS_CACHE_TENSORS  # Import from config.py
+
+
+class _LRU:
+    """Small thread-safe LRU where concurrent misses on the same key share one computation."""
+
+    def __init__(self, name, max_entries):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.incr("cache_requests_total", cache=self.name, result="hit")
+                return self._entries[key]
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+                self.misses += 1
+        metrics.incr("cache_requests_total", cache=self.name, result="miss" if owner else "shared")
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+            future.set_result(value)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+class PreprocessCache:
+    """Decodes each image once and keeps the BLIP and CLIP processor outputs for it.
+
+    Entries are keyed by the image's content hash, so the file paths the agent passes
+    between tools all resolve to the same decoded image and pixel tensors.
+    """
+
+    def __init__(self, max_images=32, max_tensors=64):
+        self.images = _LRU("decoded_image", max_images)
+        self.tensors = _LRU("pixel_tensor", max_tensors)
+
+    def image(self, image_path):
+        """Returns the decoded, model-ready RGB image for image_path."""
+        digest = media_store.content_hash(image_path)
+        return self.images.get_or_compute(digest, lambda: load_model_image(image_path))
+
+    def pixel_values(self, image_path, model_name):
+        """Returns the [1, 3, H, W] pixel tensor the processor of model_name ("blip" or "clip") makes."""
+        digest = media_store.content_hash(image_path)
+
+        def _compute():
+            processor, _ = model_registry.get(model_name)
+            return processor(images=self.image(image_path), return_tensors="pt")["pixel_values"]
+
+        return self.tensors.get_or_compute((digest, model_name), _compute)
+
+    def stats(self):
+        return {
+            "image_hits": self.images.hits,
+            "image_misses": self.images.misses,
+            "tensor_hits": self.tensors.hits,
+            "tensor_misses": self.tensors.misses,
+        }
+
+
+preprocess_cache = PreprocessCache(PREPROCESS_CACHE_IMAGES, PREPROCESS_CACHE_TENSORS)
@@ -0,0 +1,174 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes():
+    """Returns the current resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def estimate_bytes(obj):
+    """Estimates the memory held by the parameters and buffers of torch modules inside obj."""
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if isinstance(obj, dict):
+        return sum(estimate_bytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_bytes(v) for v in obj)
+    return 0
+
+
+class _Entry:
+    def __init__(self, name, loader, unloader, sizer):
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.sizer = sizer
+        self.value = None
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.size_bytes = 0
+        self.load_seconds = None
+        self.load_count = 0
+        self.last_used = None
+
+
+class ModelRegistry:
+    """Loads models on first use and keeps the resident set within a memory budget.
+
+    Models are evicted least recently used first once the budget is exceeded. An
+    evicted model is only freed once callers that still hold a reference drop it.
+    """
+
+    def __init__(self, memory_budget_mb=None):
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+        self._entries = {}
+        self._lru = OrderedDict()  # names of loaded models, least recently used first
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, unloader=None, sizer=None):
+        """Registers a loader for name. Nothing is loaded until get(name) is called."""
+        with self._lock:
+            if name in self._lru:
+                self._evict_locked(name)
+            self._entries[name] = _Entry(name, loader, unloader, sizer or estimate_bytes)
+
+    def get(self, name):
+        """Returns the loaded model for name, loading it on first use."""
+        entry = self._entries[name]
+        while True:
+            with self._lock:
+                if entry.loaded:
+                    self._touch_locked(entry)
+                    return entry.value
+            with entry.lock:
+                if not entry.loaded:
+                    return self._load(entry)
+
+    def is_loaded(self, name):
+        return self._entries[name].loaded
+
+    def evict(self, name):
+        """Drops the model for name so its memory can be reclaimed."""
+        with self._lock:
+            self._evict_locked(name)
+
+    def prewarm(self, names):
+        """Loads the given models in a background thread and returns the thread."""
+        def _run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.warning("Prewarming model '%s' failed: %s", name, e)
+
+        thread = threading.Thread(target=_run, name="model-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(self._entries[name].size_bytes for name in self._lru)
+
+    def stats(self):
+        """Returns cold-start time and resident memory for every registered model."""
+        with self._lock:
+            return {
+                name: {
+                    "loaded": entry.loaded,
+                    "load_seconds": entry.load_seconds,
+                    "load_count": entry.load_count,
+                    "resident_mb": round(entry.size_bytes / (1024 * 1024), 1),
+                    "last_used": entry.last_used,
+                }
+                for name, entry in self._entries.items()
+            }
+
+    def _load(self, entry):
+        # Make room up front when the size is known from an earlier load.
+        with self._lock:
+            self._enforce_budget_locked(incoming=entry.size_bytes, keep=entry.name)
+
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        value = entry.loader()
+        elapsed = time.perf_counter() - start
+        rss_delta = max(_rss_bytes() - rss_before, 0)
+
+        size = entry.sizer(value) or rss_delta
+        with self._lock:
+            entry.value = value
+            entry.loaded = True
+            entry.size_bytes = size
+            entry.load_seconds = elapsed
+            entry.load_count += 1
+            self._lru[entry.name] = None
+            self._touch_locked(entry)
+            self._enforce_budget_locked(keep=entry.name)
+
+        logger.info("Loaded model '%s' in %.2fs (%.1f MB resident)",
+                    entry.name, elapsed, size / (1024 * 1024))
+        return value
+
+    def _touch_locked(self, entry):
+        entry.last_used = time.time()
+        if entry.name in self._lru:
+            self._lru.move_to_end(entry.name)
+
+    def _enforce_budget_locked(self, incoming=0, keep=None):
+        if self.memory_budget_bytes is None:
+            return
+        used = sum(self._entries[name].size_bytes for name in self._lru)
+        for name in list(self._lru):
+            if used + incoming <= self.memory_budget_bytes:
+                break
+            if name == keep:
+                continue
+            used -= self._entries[name].size_bytes
+            self._evict_locked(name)
+
+    def _evict_locked(self, name):
+        entry = self._entries.get(name)
+        if entry is None or not entry.loaded:
+            return
+        value = entry.value
+        entry.value = None
+        entry.loaded = False
+        self._lru.pop(name, None)
+        if entry.unloader is not None:
+            try:
+                entry.unloader(value)
+            except Exception as e:
+                logger.warning("Unloading model '%s' failed: %s", name, e)
+        logger.info("Evicted model '%s' (%.1f MB)", name, entry.size_bytes / (1024 * 1024))
@@ -0,0 +1,253 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+from src.telemetry import metrics
+from config import (  # Import from config.py
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTLS,
+    RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text):
+    """Lowercases, collapses whitespace and drops trailing punctuation so trivial variants match."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+class ResponseCache:
+    """SQLite-backed cache of tool responses that survives restarts.
+
+    Lookups match the normalized query exactly and, when an embedder and a similarity
+    threshold are given, fall back to the most similar cached query of the same tool.
+    Entries expire after the per-tool TTL. Every evict_every stores, the least recently
+    used entries over max_entries rows are evicted. Similarity lookups score the query
+    against an in-memory matrix of each tool's embeddings, which only reads rows added
+    since the previous lookup from SQLite.
+    """
+
+    def __init__(self, path, max_entries=10000, ttls=None, embedder=None, similarity_threshold=0.0,
+                 evict_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = ttls or {}
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.evict_every = evict_every
+        self.counters = Counter()
+        self._matrices = {}  # tool -> _EmbeddingMatrix
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " tool TEXT NOT NULL, key TEXT NOT NULL, query TEXT NOT NULL, response TEXT NOT NULL,"
+            " embedding BLOB, created REAL NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (tool, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (tool, created)")
+        self._conn.commit()
+
+    @property
+    def semantic(self):
+        return self.embedder is not None and self.similarity_threshold > 0
+
+    def _oldest_valid(self, tool, now):
+        ttl = self.ttls.get(tool)
+        return now - ttl if ttl else 0.0
+
+    def get(self, tool, query):
+        """Returns the cached response for query, or None on a miss.
+
+        A failing lookup counts as a miss, so the cache never breaks the tool it serves.
+        """
+        try:
+            return self._get(tool, query)
+        except Exception as e:
+            logger.warning("Response cache lookup failed for %s: %s", tool, e)
+            metrics.incr("cache_requests_total", cache="response", tool=tool, result="error")
+            return None
+
+    def _get(self, tool, query):
+        normalized = normalize_query(query)
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        now = time.time()
+        oldest = self._oldest_valid(tool, now)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE tool = ? AND key = ? AND created >= ?",
+                (tool, key, oldest),
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ? WHERE tool = ? AND key = ?", (now, tool, key))
+                self._conn.commit()
+                self.counters[f"{tool}.hit"] += 1
+        if row is not None:
+            metrics.incr("cache_requests_total", cache="response", tool=tool, result="hit")
+            return row[0]
+
+        if self.semantic:
+            response = self._get_similar(tool, normalized, oldest, now)
+            if response is not None:
+                with self._lock:
+                    self.counters[f"{tool}.semantic_hit"] += 1
+                metrics.incr("cache_requests_total", cache="response", tool=tool, result="semantic_hit")
+                return response
+
+        with self._lock:
+            self.counters[f"{tool}.miss"] += 1
+        metrics.incr("cache_requests_total", cache="response", tool=tool, result="miss")
+        return None
+
+    def _get_similar(self, tool, normalized, oldest, now):
+        with self._lock:
+            matrix = self._matrix(tool)
+        if not matrix.keys:
+            return None
+        query_embedding = self.embedder(normalized)
+        with self._lock:
+            key, score = matrix.best(query_embedding, oldest)
+            if key is None or score < self.similarity_threshold:
+                return None
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE tool = ? AND key = ?", (tool, key)).fetchone()
+            if row is None:
+                # Evicted by another process since it was loaded
+                matrix.drop(key)
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE tool = ? AND key = ?", (now, tool, key))
+            self._conn.commit()
+        return row[0]
+
+    def _matrix(self, tool):
+        """Returns the tool's embedding matrix, first loading rows stored since the last call."""
+        matrix = self._matrices.get(tool)
+        if matrix is None:
+            matrix = self._matrices[tool] = _EmbeddingMatrix()
+        rows = self._conn.execute(
+            "SELECT key, created, embedding FROM responses"
+            " WHERE tool = ? AND created > ? AND embedding IS NOT NULL ORDER BY created",
+            (tool, matrix.loaded_until),
+        ).fetchall()
+        for key, created, blob in rows:
+            matrix.add(key, created, blob)
+        if rows:
+            matrix.loaded_until = rows[-1][1]
+        return matrix
+
+    def put(self, tool, query, response):
+        """Stores response for query; every evict_every stores, trims the cache to max_entries.
+
+        Failures are logged and otherwise ignored.
+        """
+        try:
+            self._put(tool, query, response)
+        except Exception as e:
+            logger.warning("Response cache store failed for %s: %s", tool, e)
+
+    def _put(self, tool, query, response):
+        normalized = normalize_query(query)
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        embedding = None
+        if self.semantic:
+            embedding = array("f", self.embedder(normalized).tolist()).tobytes()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (tool, key, query, response, embedding, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (tool, key, normalized, response, embedding, now, now),
+            )
+            self._puts += 1
+            if self._puts % self.evict_every == 0:
+                self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE rowid IN"
+                " (SELECT rowid FROM responses ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            self.counters["evictions"] += count - self.max_entries
+            # Reloaded from SQLite on the next similarity lookup
+            self._matrices.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+class _EmbeddingMatrix:
+    """One tool's cached query embeddings as rows of a tensor that grows in place."""
+
+    def __init__(self):
+        self.keys = []  # row -> key, None once dropped
+        self.rows = {}  # key -> row
+        self.created = None  # [capacity] float64 tensor
+        self.matrix = None  # [capacity, dim] float32 tensor
+        self.loaded_until = 0.0  # newest created time read from SQLite
+
+    def add(self, key, created, blob):
+        import torch
+        embedding = torch.frombuffer(bytearray(blob), dtype=torch.float32)
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if self.matrix is None or row == self.matrix.shape[0]:
+                capacity = max(64, 2 * row)
+                matrix = torch.zeros(capacity, embedding.shape[0])
+                created_times = torch.full((capacity,), float("-inf"), dtype=torch.float64)
+                if self.matrix is not None:
+                    matrix[:row] = self.matrix
+                    created_times[:row] = self.created
+                self.matrix, self.created = matrix, created_times
+            self.keys.append(key)
+            self.rows[key] = row
+        self.matrix[row] = embedding
+        self.created[row] = created
+
+    def drop(self, key):
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.keys[row] = None
+            self.created[row] = float("-inf")
+
+    def best(self, query_embedding, oldest):
+        """Returns (key, cosine similarity) of the best row created at or after oldest."""
+        count = len(self.keys)
+        scores = self.matrix[:count] @ query_embedding.to(self.matrix.dtype)
+        scores[self.created[:count] < oldest] = float("-inf")
+        row = int(scores.argmax())
+        if self.keys[row] is None or scores[row].item() == float("-inf"):
+            return None, None
+        return self.keys[row], scores[row].item()
+
+
+def _embed_query(text):
+    from src.embeddings import text_embeddings
+    return text_embeddings.get([text])[0]
+
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_PATH,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    ttls=RESPONSE_CACHE_TTLS,
+    embedder=_embed_query,
+    similarity_threshold=RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+)
@@ -0,0 +1,48 @@
+import re
+from collections import namedtuple
+
+# A request the router can answer with a single tool call: the tool's name and its arguments.
+Route = namedtuple("Route", ["name", "tool", "arguments"])
+
+# A ReactJsonAgent needs at least one LLM call to pick the tool and one to call final_answer.
+LLM_CALLS_PER_ROUTED_REQUEST = 2
+
+_IMAGE_UPLOAD = re.compile(r"^Image uploaded:\s*(?P<path>\S+)\s*$")
+_GENERATE_IMAGE = re.compile(
+    r"^(?:please\s+)?(?:generate|create|draw|paint|make)\s+(?:me\s+)?(?:an?\s+)?"
+    r"(?:image|picture|photo|drawing|painting|illustration)\s+(?:of|showing)\s+(?P<prompt>.+)$",
+    re.IGNORECASE | re.DOTALL,
+)
+_GENERATE_AUDIO = re.compile(
+    r"^(?:please\s+)?(?:generate|create|make)\s+(?:an?\s+)?(?:audio|speech|voice\s+recording)\s+"
+    r"(?:of|saying|for|from)\s*:?\s+(?P<prompt>.+)$",
+    re.IGNORECASE | re.DOTALL,
+)
+# Only definitional questions about a named subject ("Who was Ada Lovelace?") are looked up.
+_FACTUAL = re.compile(
+    r"^(?i:who|what)\s+(?i:is|was|are|were)\s+(?P<subject>(?:[Tt]he\s+)?[A-Z][\w .,'-]{2,80}?)\s*\??$"
+)
+# Words that point back into the conversation or at an image; such questions need the agent.
+_CONTEXTUAL = re.compile(
+    r"\b(?:it|its|he|she|him|her|they|them|this|that|these|those|image|picture|photo|"
+    r"you|your|i|me|my|we|our)\b",
+    re.IGNORECASE,
+)
+
+
+def route(query):
+    """Returns the Route for an unambiguous single-tool request, or None to use the agent."""
+    query = query.strip()
+    match = _IMAGE_UPLOAD.match(query)
+    if match:
+        return Route("caption", "blip_image_caption", {"image_path": match.group("path")})
+    match = _GENERATE_IMAGE.match(query)
+    if match:
+        return Route("generate_image", "generate_image", {"prompt": match.group("prompt").strip()})
+    match = _GENERATE_AUDIO.match(query)
+    if match:
+        return Route("generate_audio", "generate_audio_from_text", {"prompt": match.group("prompt").strip()})
+    match = _FACTUAL.match(query)
+    if match and not _CONTEXTUAL.search(match.group("subject")):
+        return Route("wiki", "wiki_search", {"query": match.group("subject").strip()})
+    return None
@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+import time
+from src.memory import ConversationStore
+from config import STATE_STORE_PATH, SESSION_IDLE_TTL_SECONDS  # Import from config.py
+
+
+class StateStore:
+    """SQLite store for state shared by all workers: conversation turns and agent runs.
+
+    Every worker process opens the same file; WAL mode lets them read while one writes.
+    Only each session's latest run is kept, and runs older than run_ttl_seconds expire.
+    """
+
+    def __init__(self, path, run_ttl_seconds=3600.0):
+        self.path = path
+        self.run_ttl_seconds = run_ttl_seconds
+        self._last_sweep = 0.0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " session_id TEXT NOT NULL, created REAL NOT NULL, text TEXT NOT NULL, tokens INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, created);"
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, created REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS runs_session ON runs (session_id, created);"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add_turn(self, session_id, text, tokens, max_turns):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT INTO turns (session_id, created, text, tokens) VALUES (?, ?, ?, ?)",
+                         (session_id, time.time(), text, tokens))
+            conn.execute(
+                "DELETE FROM turns WHERE session_id = ? AND rowid NOT IN"
+                " (SELECT rowid FROM turns WHERE session_id = ? ORDER BY created DESC LIMIT ?)",
+                (session_id, session_id, max_turns),
+            )
+
+    def turns(self, session_id, newer_than):
+        """Returns the session's (text, token_count) turns added after newer_than, oldest first."""
+        return self._conn().execute(
+            "SELECT text, tokens FROM turns WHERE session_id = ? AND created > ? ORDER BY created",
+            (session_id, newer_than),
+        ).fetchall()
+
+    def clear_session(self, session_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+
+    def expire_turns(self, older_than):
+        """Deletes turns and runs created before older_than."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM turns WHERE created < ?", (older_than,))
+            conn.execute("DELETE FROM runs WHERE created < ?", (older_than,))
+
+    def session_count(self, newer_than):
+        return self._conn().execute(
+            "SELECT COUNT(DISTINCT session_id) FROM turns WHERE created > ?", (newer_than,)
+        ).fetchone()[0]
+
+    def record_run(self, session_id, run_id):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO runs (run_id, session_id, created) VALUES (?, ?, ?)",
+                         (run_id, session_id, time.time()))
+            # last_run() is all that reads the table, so earlier runs of the session can go
+            conn.execute("DELETE FROM runs WHERE session_id = ? AND run_id != ?", (session_id, run_id))
+        now = time.monotonic()
+        if now - self._last_sweep > min(self.run_ttl_seconds, 60):
+            self._last_sweep = now
+            with conn:
+                conn.execute("DELETE FROM runs WHERE created < ?", (time.time() - self.run_ttl_seconds,))
+
+    def last_run(self, session_id):
+        """Returns the id of the session's most recent run, or None."""
+        row = self._conn().execute(
+            "SELECT run_id FROM runs WHERE session_id = ? ORDER BY created DESC LIMIT 1", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+
+class SharedConversationStore(ConversationStore):
+    """ConversationStore keeping the turns in a StateStore, so any worker can serve any session.
+
+    A session's turns expire idle_ttl_seconds after they were added.
+    """
+
+    def __init__(self, state_store, **kwargs):
+        super().__init__(**kwargs)
+        self.state_store = state_store
+
+    def _oldest_valid(self):
+        return time.time() - self.idle_ttl_seconds
+
+    def add_turn(self, session_id, role, content):
+        text, count = self._tail(f"{role}: {content}", self.max_context_tokens)
+        self.state_store.add_turn(session_id, text, count, self.max_turns)
+        now = time.monotonic()
+        if now - self._last_sweep > min(self.idle_ttl_seconds, 60):
+            self._last_sweep = now
+            self.state_store.expire_turns(self._oldest_valid())
+
+    def _turns(self, session_id):
+        return self.state_store.turns(session_id, self._oldest_valid())
+
+    def clear(self, session_id):
+        self.state_store.clear_session(session_id)
+
+    def session_count(self):
+        return self.state_store.session_count(self._oldest_valid())
+
+
+state_store = StateStore(STATE_STORE_PATH, run_ttl_seconds=SESSION_IDLE_TTL_SECONDS)
@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import re
+from transformers.agents import HfApiEngine
+from transformers.agents.llm_engine import get_clean_message_list, llama_role_conversions
+from src.telemetry import metrics, span
+from src.clients import client_layer
+
+# Callable receiving event dicts for the request being processed, or None when not streaming.
+event_sink = contextvars.ContextVar("event_sink", default=None)
+
+
+def emit(event_type, **data):
+    """Sends an event to the current request's sink, if it is streaming."""
+    sink = event_sink.get()
+    if sink is not None:
+        sink({"type": event_type, **data})
+
+
+async def aiter_events(target, outcome):
+    """Runs the coroutine target(sink) as a task on the running loop and yields the events
+    it emits from any thread.
+
+    target's result is stored in outcome["result"]; an exception raised by target is
+    re-raised once all events have been yielded.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def _sink(event):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    # The task runs in a copy of the caller's context, so request-scoped settings carry over
+    task = asyncio.ensure_future(target(_sink))
+    # Events sent from other threads are queued before the task can finish, so None comes last
+    task.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+        outcome["result"] = task.result()
+    finally:
+        # The client went away before the run finished
+        task.cancel()
+
+
+class FinalAnswerExtractor:
+    """Pulls the answer string out of a streamed `final_answer` action blob as it arrives."""
+
+    _ANSWER_START = re.compile(r'"(?:answer|action_input)"\s*:\s*"')
+    _ESCAPES = {"n": "\n", "t": "\t", '"': '"', "\\": "\\", "/": "/"}
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = None  # index in buffer of the next answer character
+        self.done = False
+        self._escaped = False
+
+    def feed(self, delta):
+        """Adds streamed text and returns the newly available part of the answer."""
+        self.buffer += delta
+        if self.done:
+            return ""
+        if self.position is None:
+            action = self.buffer.find('"final_answer"')
+            if action == -1:
+                return ""
+            match = self._ANSWER_START.search(self.buffer, action)
+            if match is None:
+                return ""
+            self.position = match.end()
+
+        out = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            self.position += 1
+            if self._escaped:
+                out.append(self._ESCAPES.get(char, char))
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self.done = True
+                break
+            else:
+                out.append(char)
+        return "".join(out)
+
+
+class StreamingHfApiEngine(HfApiEngine):
+    """HfApiEngine that streams tokens from the endpoint when the request is streaming.
+
+    Raw tokens are emitted as "llm_token" events and the text of a final answer as
+    "answer_token" events, so the UI can show the answer before the agent step ends.
+    Every call is timed and its token usage counted.
+    """
+
+    def __call__(self, messages, stop_sequences=[], grammar=None) -> str:
+        messages = get_clean_message_list(messages, role_conversions=llama_role_conversions)
+        with span("external_request", endpoint="llm"):
+            if event_sink.get() is None or grammar is not None:
+                response = self._complete(messages, stop_sequences, grammar)
+            else:
+                response = self._stream(messages, stop_sequences)
+        for stop_seq in stop_sequences:
+            if response[-len(stop_seq):] == stop_seq:
+                response = response[: -len(stop_seq)]
+        return response
+
+    def _complete(self, messages, stop_sequences, grammar):
+        kwargs = {"response_format": grammar} if grammar is not None else {}
+        # Identical concurrent requests (e.g. the first step of the same query) are sent once
+        key = hashlib.sha256(
+            json.dumps([messages, stop_sequences, grammar], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        output = client_layer.call("llm", key, lambda: self.client.chat_completion(
+            messages, stop=stop_sequences, max_tokens=1500, **kwargs))
+        usage = getattr(output, "usage", None)
+        if usage is not None:
+            metrics.incr("llm_tokens_total", usage.prompt_tokens, kind="prompt")
+            metrics.incr("llm_tokens_total", usage.completion_tokens, kind="completion")
+        return output.choices[0].message.content
+
+    def _stream(self, messages, stop_sequences):
+        extractor = FinalAnswerExtractor()
+        pieces = []
+        # A stream holds its endpoint slot until it ends; it is not retried once tokens were shown
+        with client_layer.limit("llm"):
+            for chunk in self.client.chat_completion(messages, stop=stop_sequences, max_tokens=1500, stream=True):
+                delta = chunk.choices[0].delta.content or ""
+                if not delta:
+                    continue
+                pieces.append(delta)
+                emit("llm_token", text=delta)
+                answer = extractor.feed(delta)
+                if answer:
+                    emit("answer_token", text=answer)
+        # Each streamed chunk carries one generated token
+        metrics.incr("llm_tokens_total", len(pieces), kind="completion")
+        return "".join(pieces)
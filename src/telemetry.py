@@ -0,0 +1,167 @@
+import bisect
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import TRACE_PAYLOAD_SAMPLE_RATE  # Import from config.py
+
+# Histogram bucket upper bounds in seconds, shared by every timing series.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Payloads (messages, prompts, responses) go to this logger, for sampled requests only.
+payload_logger = logging.getLogger("payloads")
+
+# Whether payloads are logged for the current request.
+_verbose = contextvars.ContextVar("verbose_payloads", default=False)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """In-process counters and timing histograms rendered in the Prometheus text format.
+
+    Recording is a dict update under a lock, cheap enough for every call on the hot path.
+    Collectors registered with add_collector are polled at scrape time for gauges.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}  # key -> [bucket counts..., sum, count]
+        self._collectors = []
+
+    def incr(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 2)
+            if index < len(BUCKETS):
+                histogram[index] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def add_collector(self, collector):
+        """Registers collector(), returning (name, labels, value) gauges, to be read at scrape time."""
+        self._collectors.append(collector)
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def render(self):
+        """Returns all series in the Prometheus text exposition format."""
+        def _labels(pairs, extra=()):
+            pairs = list(pairs) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (series, labels), value in sorted(counters.items()):
+                if series == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (series, labels), values in sorted(histograms.items()):
+                if series != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {values[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {values[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {values[-1]}")
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    lines.append(f"{name}{_labels(sorted(labels.items()))} {value}")
+            except Exception as e:
+                lines.append(f"# collector failed: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def span(name, **labels):
+    """Records the duration of the enclosed block as `<name>_duration_seconds`.
+
+    An exception escaping the block is counted in `<name>_errors_total` and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.incr(f"{name}_errors_total", **labels)
+        raise
+    finally:
+        metrics.observe(f"{name}_duration_seconds", time.perf_counter() - start, **labels)
+
+
+def start_request(verbose=None):
+    """Decides whether payloads are logged for the current request.
+
+    verbose=True forces payload logging; otherwise the request is sampled at
+    TRACE_PAYLOAD_SAMPLE_RATE.
+    """
+    enabled = bool(verbose) or (TRACE_PAYLOAD_SAMPLE_RATE > 0 and random.random() < TRACE_PAYLOAD_SAMPLE_RATE)
+    _verbose.set(enabled)
+    return enabled
+
+
+def payload_logging():
+    return _verbose.get()
+
+
+def set_payload_logging(enabled):
+    """Sets payload logging for the current context, e.g. from a flag carried in the run config."""
+    _verbose.set(bool(enabled))
+
+
+def log_payload(message, *args):
+    """Logs a payload line for sampled requests; formatting is skipped for the others."""
+    if _verbose.get():
+        payload_logger.info(message, *args)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """Serves /metrics on the given port from a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -1,25 +1,55 @@
-import os
-import time
-import soundfile as sf
-from PIL import Image
+import functools
 from transformers.tools import Tool  # Corrected import
 from src.models import (
+    model_registry,
     wiki_wrapper,
-    blip_processor,
-    blip_model,
-    clip_processor,
-    clip_model,
-    client_sd,
-    llm_engine,
-    generate_audio,
-    SAMPLE_RATE
+    llm_engine
 )
+from src.inference import caption_image, clip_logit_scale
+from src.embeddings import image_index, text_embeddings
+from src.response_cache import response_cache
+from src.audio import synthesize_to_file
 from src.utils import save_image
-from config import AUDIO_DIR, IMAGE_DIR  # Import from config.py
+from src.media_store import media_store
+from src.clients import client_layer
+from src.executors import cpu_executor, run_in
+from src.telemetry import metrics, span, log_payload
+from config import CLIP_MATCH_THRESHOLD, IMAGE_SEED  # Import from config.py
 
 # Define generated_image_paths at module level
 generated_image_paths = []
 
+def traced(forward):
+    """Times a tool's forward call and counts calls that return an error message."""
+    @functools.wraps(forward)
+    def wrapper(self, *args, **kwargs):
+        with span("tool_call", tool=self.name):
+            result = forward(self, *args, **kwargs)
+        if isinstance(result, str) and result.startswith("Error"):
+            metrics.incr("tool_errors_total", tool=self.name)
+        return result
+    return wrapper
+
+def atraced(aforward):
+    """Async counterpart of traced for a tool's aforward coroutine."""
+    @functools.wraps(aforward)
+    async def wrapper(self, *args, **kwargs):
+        with span("tool_call", tool=self.name):
+            result = await aforward(self, *args, **kwargs)
+        if isinstance(result, str) and result.startswith("Error"):
+            metrics.incr("tool_errors_total", tool=self.name)
+        return result
+    return wrapper
+
+async def acall_tool(tool, **arguments):
+    """Awaits a tool. Tools with an async client define aforward and run on the event loop;
+    io_bound tools run on the loop's default executor and the others (local BLIP, CLIP and
+    Bark inference) on the CPU executor."""
+    aforward = getattr(tool, "aforward", None)
+    if aforward is not None:
+        return await aforward(**arguments)
+    return await run_in(None if getattr(tool, "io_bound", False) else cpu_executor, tool, **arguments)
+
 class wiki_tool__(Tool):
     name = "wiki_search"
     description = "Search Wikipedia for relevant information."
@@ -31,10 +61,19 @@ class wiki_tool__(Tool):
         }
     }
     output_type = "string"
+    # The Wikipedia client is synchronous and waits on the network, not the CPU
+    io_bound = True
 
+    @traced
     def forward(self, query: str) -> str:
         try:
-            return wiki_wrapper.run(query)
+            cached = response_cache.get(self.name, query)
+            if cached is not None:
+                return cached
+            with span("external_request", endpoint="wikipedia"):
+                result = wiki_wrapper.run(query)
+            response_cache.put(self.name, query, result)
+            return result
         except Exception as e:
             return f"Error in Wikipedia search: {str(e)}"
 
@@ -57,24 +96,31 @@ class gpt_text_response__(Tool):
     }
     output_type = "string"
 
+    @traced
     def forward(self, query: str, context: str = "") -> str:
         """Generate a text response using the LLM."""
         try:
-            print(f"[DEBUG] gpt_text_response received query: {query}")
-            print(f"[DEBUG] gpt_text_response received context: {context}")
+            log_payload("gpt_text_response received query: %s", query)
+            log_payload("gpt_text_response received context: %s", context)
+
+            cached = response_cache.get(self.name, f"{query} {context}")
+            if cached is not None:
+                log_payload("gpt_text_response served from cache")
+                return cached
 
             messages = [{"role": "user", "content": f"{query} {context}"}]
-            print(f"[DEBUG] Combined input for LLM: {messages}")
+            log_payload("Combined input for LLM: %s", messages)
 
             response = llm_engine(messages)
-            print(f"[DEBUG] gpt_text_response raw response: {response}")
+            log_payload("gpt_text_response raw response: %s", response)
 
             response_content = response.strip()
-            print(f"[DEBUG] gpt_text_response processed content: {response_content}")
+            log_payload("gpt_text_response processed content: %s", response_content)
+            response_cache.put(self.name, f"{query} {context}", response_content)
 
             return response_content
         except Exception as e:
-            print(f"[DEBUG] Error in gpt_text_response: {str(e)}")
+            log_payload("Error in gpt_text_response: %s", e)
             return f"Error: {str(e)}"
 
 gpt_text_response = gpt_text_response__()
@@ -96,14 +142,11 @@ class blip_image_caption__(Tool):
     }
     output_type = "string"
 
+    @traced
     def forward(self, image_path: str, context: str = "") -> str:
         """Generate a caption for or describe an image using the BLIP model."""
         try:
-            image = Image.open(image_path)
-            inputs = blip_processor(image, return_tensors="pt")
-            out = blip_model.generate(**inputs)
-            caption = blip_processor.decode(out[0], skip_special_tokens=True)
-            return caption
+            return caption_image(image_path)
         except Exception as e:
             return f"Error in generating caption: {str(e)}"
 
@@ -126,28 +169,56 @@ class generate_image__(Tool):
     }
     output_type = "string"
 
+    @traced
     def forward(self, prompt: str, context: str = "") -> str:
-        global generated_image_paths
         try:
-            image_response = client_sd.text_to_image(prompt + " " + context)
-            image = image_response  # Assuming it's a PIL Image
-
-            filename = f"generated_image_{int(time.time())}.png"
-            saved_path = save_image(image, filename)
-
-            generated_image_paths.append(saved_path)
-            print(f"[DEBUG] Appended image path: {saved_path}")
-            print(f"[DEBUG] Current generated_image_paths: {generated_image_paths}")
+            client_sd = model_registry.get("client_sd")
+            full_prompt, key, kwargs = self._request(prompt, context)
+            with span("external_request", endpoint="stable_diffusion"):
+                image = client_layer.call(
+                    "stable_diffusion", key, lambda: client_sd.text_to_image(full_prompt, **kwargs),
+                    cacheable=IMAGE_SEED is not None,
+                )
+            return self._store(image)  # Returning the path so Gradio can display it
+        except Exception as e:
+            return f"Error in generating image: {str(e)}"
 
-            return saved_path  # Returning the path so Gradio can display it
+    @atraced
+    async def aforward(self, prompt: str, context: str = "") -> str:
+        try:
+            client_sd = await run_in(None, model_registry.get, "client_sd_async")
+            full_prompt, key, kwargs = self._request(prompt, context)
+            with span("external_request", endpoint="stable_diffusion"):
+                image = await client_layer.acall(
+                    "stable_diffusion", key, lambda: client_sd.text_to_image(full_prompt, **kwargs),
+                    cacheable=IMAGE_SEED is not None,
+                )
+            # PNG encoding, hashing and indexing are CPU work
+            return await run_in(cpu_executor, self._store, image)
         except Exception as e:
             return f"Error in generating image: {str(e)}"
 
+    @staticmethod
+    def _request(prompt, context):
+        full_prompt = prompt + " " + context
+        # With a fixed seed the same prompt always gives the same image, so it can be reused
+        kwargs = {"seed": IMAGE_SEED} if IMAGE_SEED is not None else {}
+        return full_prompt, (full_prompt, IMAGE_SEED), kwargs
+
+    @staticmethod
+    def _store(image):
+        saved_path = save_image(image, "generated_image")
+        generated_image_paths.append(saved_path)
+        image_index.add_async(saved_path)
+        log_payload("Appended image path: %s", saved_path)
+        return saved_path
+
 generate_image = generate_image__()
 
 class compare_image_to_text__(Tool):
     name = "compare_image_to_text"
-    description = "Compares a user-uploaded image to a user input text description using the CLIP model and returns a similarity score."
+    description = ("Compares a user-uploaded image to a user input text description using the CLIP model and returns a similarity score. "
+                   "Separate several candidate descriptions with '|' to rank them all against the image in one call.")
 
     inputs = {
         "image_path": {
@@ -156,7 +227,7 @@ class compare_image_to_text__(Tool):
         },
         "description": {
             "type": "string",
-            "description": "Text description to compare with the image."
+            "description": "Text description to compare with the image, or several descriptions separated by '|'."
         },
         "context": {
             "type": "string",
@@ -166,24 +237,26 @@ class compare_image_to_text__(Tool):
     }
     output_type = "string"
 
+    @traced
     def forward(self, image_path: str, description: str, context: str = "") -> str:
-        """Compare an image to a text description using the CLIP model."""
+        """Compare an image to one or more text descriptions using the CLIP model."""
         try:
-            image = Image.open(image_path)
-            inputs = clip_processor(
-                text=[description + " " + context],
-                images=image,
-                return_tensors="pt",
-                padding=True
-            )
-            outputs = clip_model(**inputs)
-            logits_per_image = outputs.logits_per_image
-            similarity = logits_per_image.softmax(dim=1)
-            score = similarity[0][0].item()
-            if score > 0.5:
-                return f"The image is very similar to the description '{description}'."
-            else:
-                return f"The image is not similar to the description '{description}'."
+            candidates = [c.strip() for c in description.split("|") if c.strip()] or [description]
+            texts = [f"{c} {context}".strip() for c in candidates]
+            image_embedding = image_index.embedding(image_path)
+            similarities = text_embeddings.get(texts) @ image_embedding
+
+            if len(candidates) == 1:
+                score = similarities[0].item()
+                if score > CLIP_MATCH_THRESHOLD:
+                    return f"The image is very similar to the description '{description}' (similarity {score:.2f})."
+                else:
+                    return f"The image is not similar to the description '{description}' (similarity {score:.2f})."
+
+            probabilities = (similarities * clip_logit_scale()).softmax(dim=0).tolist()
+            ranking = sorted(zip(candidates, probabilities), key=lambda pair: pair[1], reverse=True)
+            lines = [f"{rank}. '{c}' ({p:.2f})" for rank, (c, p) in enumerate(ranking, start=1)]
+            return "Descriptions ranked by similarity to the image:\n" + "\n".join(lines)
         except Exception as e:
             return f"Error in comparing image to text: {str(e)}"
 
@@ -201,28 +274,52 @@ class generate_audio_from_text__(Tool):
     }
     output_type = "audio"
 
+    @traced
     def forward(self, prompt: str) -> str:
         try:
-            audio_array = generate_audio(prompt)
-
-            audio_filename = f"generated_audio_{int(time.time())}.wav"
-            audio_path = os.path.join(AUDIO_DIR, audio_filename)
+            audio_path = media_store.allocate("audio", "generated_audio", ".wav")
 
-            sf.write(audio_path, audio_array, SAMPLE_RATE)
+            timings = synthesize_to_file(prompt, audio_path)
 
-            print(f"Audio generated successfully at: {audio_path}")
+            log_payload("Audio generated successfully at: %s (first audio after %.2fs, total %.2fs)",
+                        audio_path, timings["time_to_first_audio"], timings["total_seconds"])
             return audio_path
         except Exception as e:
-            print(f"Error in generating audio: {str(e)}")
+            log_payload("Error in generating audio: %s", e)
             return f"Error in generating audio: {str(e)}"
 
 generate_audio_from_text = generate_audio_from_text__()
 
+class search_images__(Tool):
+    name = "search_images"
+    description = "Finds the previously uploaded or generated image that best matches a text description and returns its path."
+
+    inputs = {
+        "query": {
+            "type": "string",
+            "description": "Description of the image to find."
+        }
+    }
+    output_type = "string"
+
+    @traced
+    def forward(self, query: str) -> str:
+        try:
+            matches = image_index.search(query, top_k=1)
+            if not matches:
+                return "No uploaded or generated images are available yet."
+            return matches[0][0]
+        except Exception as e:
+            return f"Error in searching images: {str(e)}"
+
+search_images = search_images__()
+
 tools = [
     gpt_text_response,
     blip_image_caption,
     generate_image,
     compare_image_to_text,
     generate_audio_from_text,
+    search_images,
     wiki_tool
 ]
@@ -1,18 +1,27 @@
 import os
 from PIL import Image
+from src.media_store import media_store
 from config import IMAGE_DIR  # Import from config.py
 
-def save_image(image, filename):
-    """Saves the given image to the specified filename in the fixed directory."""
+def save_image(image, prefix="image"):
+    """Stores the given image (a PIL image or the path of an already-saved file) in the media store.
+
+    Returns the stored path; identical images are stored once.
+    """
     try:
-        path = os.path.join(IMAGE_DIR, filename)
         if isinstance(image, str):
-            image = Image.open(image)
-        image.save(path)
-        return path
+            return media_store.put_file(image, kind="image", prefix=prefix)
+        return media_store.put_image(image, prefix=prefix)
     except Exception as e:
         return f"Error saving image: {str(e)}"
 
+def load_model_image(image_path):
+    """Returns the image at image_path as a downscaled RGB PIL image ready for BLIP/CLIP."""
+    try:
+        return media_store.model_image(image_path)
+    except OSError:
+        return Image.open(image_path).convert("RGB")
+
 def retrieve_image_path(filename):
     """Retrieves the path of the specified image from the fixed directory."""
     return os.path.join(IMAGE_DIR, filename)
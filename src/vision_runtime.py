@@ -0,0 +1,76 @@
+import logging
+import os
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Precision/runtime modes for the BLIP and CLIP vision models.
+VISION_RUNTIMES = ("eager", "int8", "onnx")
+
+
+def quantize_int8(model):
+    """Returns model with its linear layers replaced by dynamically quantized int8 ones."""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _ImageFeatures(torch.nn.Module):
+    def __init__(self, clip_model):
+        super().__init__()
+        self.clip_model = clip_model
+
+    def forward(self, pixel_values):
+        return self.clip_model.get_image_features(pixel_values=pixel_values)
+
+
+class OnnxClipModel:
+    """CLIP whose image tower runs in ONNX Runtime; text features and logit_scale stay in PyTorch.
+
+    The image tower is exported once to onnx_path and reused across restarts. Image
+    embeddings dominate CLIP's cost here, since every uploaded and generated image is indexed.
+    """
+
+    def __init__(self, clip_model, onnx_path, num_threads=0):
+        import onnxruntime as ort
+
+        self.torch_model = clip_model
+        if not os.path.exists(onnx_path):
+            os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+            dummy = torch.zeros(1, 3, 224, 224)
+            tmp_path = f"{onnx_path}.tmp"
+            torch.onnx.export(
+                _ImageFeatures(clip_model), (dummy,), tmp_path,
+                input_names=["pixel_values"], output_names=["image_embeds"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                opset_version=17,
+            )
+            os.replace(tmp_path, onnx_path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def get_image_features(self, pixel_values):
+        (embeds,) = self.session.run(None, {"pixel_values": pixel_values.numpy()})
+        return torch.from_numpy(embeds)
+
+    def __getattr__(self, name):
+        return getattr(self.torch_model, name)
+
+
+def apply_runtime(model, model_name, runtime, onnx_dir, num_threads=0):
+    """Converts an eager fp32 BLIP or CLIP model to the given runtime.
+
+    BLIP's autoregressive decoder has no ONNX path here, so "onnx" gives the int8 model for
+    it; if onnxruntime is not installed CLIP falls back the same way.
+    """
+    if runtime not in VISION_RUNTIMES:
+        raise ValueError(f"Unknown VISION_RUNTIME '{runtime}', expected one of: {', '.join(VISION_RUNTIMES)}")
+    if runtime == "eager":
+        return model
+    if runtime == "onnx" and model_name == "clip":
+        try:
+            return OnnxClipModel(model, os.path.join(onnx_dir, "clip-image.onnx"), num_threads)
+        except ImportError as e:
+            logger.warning("ONNX Runtime unavailable, using int8 CLIP instead: %s", e)
+    return quantize_int8(model)
@@ -1,18 +1,37 @@
+import queue
+import time
+from contextlib import contextmanager
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from typing import Annotated, TypedDict
-from src.tools import tools
-from transformers import ReactJsonAgent
-from langsmith.run_helpers import get_current_run_tree
+from src.tools import tools, acall_tool
+from src.executors import agent_executor, run_in
+from src.agent import BudgetedReactJsonAgent
 from langsmith import traceable
-from src.models import llm_engine
-
-# Define context and current_run_id within this module
-context = ""
-current_run_id = None
+from src.models import llm_engine, model_registry
+from src.memory import ConversationStore
+from src.state_store import state_store, SharedConversationStore
+from src.router import route, LLM_CALLS_PER_ROUTED_REQUEST
+from src.streaming import emit, event_sink
+from src.telemetry import metrics, log_payload, set_payload_logging
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from config import (  # Import from config.py
+    AGENT_POOL_SIZE,
+    SESSION_MAX_TURNS,
+    SESSION_CONTEXT_TOKENS,
+    SESSION_IDLE_TTL_SECONDS,
+    FAST_PATH_ROUTING,
+    SESSION_BACKEND,
+    AGENT_DEADLINE_SECONDS,
+    AGENT_TOKEN_BUDGET,
+)
+
+DEFAULT_SESSION_ID = "default"
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
+    session_id: str
+    route: str
 
 def should_continue(state: State) -> str:
     """Determine whether to continue processing or stop."""
@@ -23,8 +42,7 @@ def should_continue(state: State) -> str:
     return END
 
 
-agent = ReactJsonAgent(llm_engine=llm_engine, tools=tools, max_iterations=10, verbose=True,
-                    system_prompt ='''
+SYSTEM_PROMPT = '''
                     {You are an expert assistant who can solve any task using JSON tool calls. You will be given a task to solve as best you can.\nTo do so, you have been given access to the following tools: <<tool_names>>\nThe way you use the tools is by specifying a json blob, ending with \'<end_action>\'.\nSpecifically, this json should have an action key (name of the tool to use) and an action_input key (input to the tool).\n\nThe $ACTION_JSON_BLOB should only contain a SINGLE action, do NOT return a list of multiple actions. It should be formatted in json. Do not try to escape special characters. Here is the template of a valid $ACTION_JSON_BLOB:\n{\n "action": $TOOL_NAME,\n "action_input": $INPUT\n}<end_action>\n\nMake sure to have the $INPUT as a dictionary in the right format for the tool you are using, and do not put variable names as input if you can find the right values.\n\nYou should ALWAYS use the following format:\n\nThought: you should always think about one action to take. Then use the action as follows:\nAction:\n$ACTION_JSON_BLOB\nObservation: the result of the action\n... (this Thought/Action/Observation can repeat N times, you should take several steps when needed. The $ACTION_JSON_BLOB must only use a SINGLE action at a time.)\n\nYou can use the result of the previous action as input for the next action.\nThe observation will always be a string: it can represent a file, like "image_1.jpg".\nThen you can use it as input for the next action. You can do it for instance as follows:\n\nObservation: "image_1.jpg"\n\nThought: I need to transform the image that I received in the previous observation to make it green.\nAction:\n{\n "action": "image_transformer",\n "action_input": {"image": "image_1.jpg"}\n}<end_action>\n\nTo provide the final answer to the task, use an action blob with "action": "final_answer" tool. It is the only way to complete the task, else you will be stuck on a loop. So your final output should look like this:\nAction:\n{\n "action": "final_answer",\n "action_input": {"answer": "insert your final answer here"}\n}<end_action>\n\n\nHere are a few examples using notional tools:\n---\nTask: "Generate an image of the oldest person in this document."\n\nThought: I will proceed step by step and use the following tools: document_qa to find the oldest person in the document, then image_generator to generate an image according to the answer.\nAction:\n{\n "action": "document_qa",\n "action_input": {"document": "document.pdf", "question": "Who is the oldest person mentioned?"}\n}<end_action>\nObservation: "The oldest person in the document is John Doe, a 55 year old lumberjack living in Newfoundland."\n\n\nThought: I will now generate an image showcasing the oldest person.\nAction:\n{\n "action": "image_generator",\n "action_input": {"text": ""A portrait of John Doe, a 55-year-old man living in Canada.""}\n}<end_action>\nObservation: "image.png"\n\nThought: I will now return the generated image.\nAction:\n{\n "action": "final_answer",\n "action_input": "image.png"\n}<end_action>\n\n---\nTask: "What is the result of the following operation: 5 + 3 + 1294.678?"\n\nThought: I will use python code evaluator to compute the result of the operation and then return the final answer using the final_answer tool\nAction:\n{\n "action": "python_interpreter",\n "action_input": {"code": "5 + 3 + 1294.678"}\n}<end_action>\nObservation: 1302.678\n\nThought: Now that I know the result, I will now return it.\nAction:\n{\n "action": "final_answer",\n "action_input": "1302.678"\n}<end_action>\n\n---\nTask: "Which city has the highest population , Guangzhou or Shanghai?"\n\nThought: I need to get the populations for both cities and compare them: I will use the tool search to get the population of both cities.\nAction:\n{\n "action": "search",\n "action_input": "Population Guangzhou"\n}<end_action>\nObservation: [\'Guangzhou has a population of 15 million inhabitants as of 2021.\']\n\n\nThought: Now let\'s get the population of Shanghai using the tool \'search\'.\nAction:\n{\n "action": "search",\n "action_input": "Population Shanghai"\n}\nObservation: \'26 million (2019)\'\n\nThought: Now I know that Shanghai has a larger population. Let\'s return the result.\nAction:\n{\n "action": "final_answer",\n "action_input": "Shanghai"\n}<end_action>\n\n\nAbove example were using notional tools that might not exist for you. You only have acces to those tools:\n<<tool_descriptions>>\n\nHere are the rules you should always follow to solve your task:\n1. ALWAYS provide a \'Thought:\' sequence, and an \'Action:\' sequence that ends with <end_action>, else you will fail.\n2. Always use the right arguments for the tools. Never use variable names in the \'action_input\' field, use the value instead.\n3. Call a tool only when needed: do not call the search agent if you do not need information, try to solve the task yourself.\n4. Never re-do a tool call that you previously did with the exact same parameters.\n\nNow Begin! If you solve the task correctly, you will receive a reward of $1,000,000.\n'
                     ### Additional Rules to Enforce Stopping Criteria:
                         1. **Stop After Answering the Question**: Once you determine the correct answer or have enough information to answer the task, immediately call the `final_answer` tool to provide the result and stop. Do not proceed with any further tool calls or actions.
@@ -36,48 +54,201 @@ agent = ReactJsonAgent(llm_engine=llm_engine, tools=tools, max_iterations=10, ve
                         7. **Keep Responses Concise**: Keep your thoughts and answers concise. Avoid going off on tangents or providing unnecessary details unless requested.
                         By adhering to these additional rules, you will avoid unnecessary loops and provide efficient, accurate answers to the task.}'
                                             }'''
-                    )
 
-@traceable
-def call_model(state: State):
-    """Invoke the model with the accumulated context and current state."""
-    global context, current_run_id  # Use global variables defined in this module
+
+def _count_tokens(text):
+    try:
+        return len(model_registry.get("llm_tokenizer").encode(text, add_special_tokens=False))
+    except Exception:
+        return len(text) // 4
+
+
+def make_agent():
+    return BudgetedReactJsonAgent(llm_engine=llm_engine, tools=tools, max_iterations=10, verbose=True,
+                                  system_prompt=SYSTEM_PROMPT, count_tokens=_count_tokens)
+
+
+# ReactJsonAgent keeps per-run state on the instance, so each concurrent run borrows its own.
+_agent_pool = queue.Queue(maxsize=AGENT_POOL_SIZE)
+
+
+@contextmanager
+def borrow_agent():
+    try:
+        agent = _agent_pool.get_nowait()
+    except queue.Empty:
+        agent = make_agent()
+    try:
+        yield agent
+    finally:
+        try:
+            _agent_pool.put_nowait(agent)
+        except queue.Full:
+            pass
+
+
+_session_settings = dict(
+    max_turns=SESSION_MAX_TURNS,
+    max_context_tokens=SESSION_CONTEXT_TOKENS,
+    idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS,
+    tokenizer_loader=lambda: model_registry.get("llm_tokenizer"),
+)
+# With several workers, history lives in the shared state store so any worker can serve a session
+if SESSION_BACKEND == "sqlite":
+    conversation_store = SharedConversationStore(state_store, **_session_settings)
+else:
+    conversation_store = ConversationStore(**_session_settings)
+metrics.add_collector(lambda: [("active_sessions", {}, conversation_store.session_count())])
+
+def _step_event(step_log):
+    """Turns a ReactJsonAgent step log into a Thought/Action/Observation event."""
+    tool_call = step_log.get("tool_call") or {}
+    return {
+        "iteration": step_log.get("iteration"),
+        "thought": step_log.get("rationale", "").strip(),
+        "action": tool_call.get("tool_name"),
+        "action_input": tool_call.get("tool_arguments"),
+        "observation": step_log.get("observation"),
+        "error": str(step_log["error"]) if step_log.get("error") else None,
+    }
+
+
+@contextmanager
+def node_context(config):
+    """Applies the request settings carried in the run config (event sink, payload logging)."""
+    configurable = (config or {}).get("configurable") or {}
+    if "verbose_payloads" in configurable:
+        set_payload_logging(configurable["verbose_payloads"])
+    token = event_sink.set(configurable.get("event_sink"))
+    try:
+        yield
+    finally:
+        event_sink.reset(token)
+
+
+_tools_by_name = {tool.name: tool for tool in tools}
+
+
+def _select_route(state: State):
     messages = state['messages']
-    print(f"[DEBUG] messages in call__{messages}")
+    query = messages[-1].content if messages else ""
+    selected = route(query) if FAST_PATH_ROUTING else None
+    if selected is None:
+        metrics.incr("router_requests_total", route="agent")
+    else:
+        log_payload("Routing %s to %s(%s)", query, selected.tool, selected.arguments)
+    return query, selected
+
+
+def _routed(state: State, query, selected, observation, node_start):
+    emit("step", iteration=0, thought=f"Routed directly to {selected.tool}.", action=selected.tool,
+         action_input=selected.arguments, observation=observation, error=None)
+    response_content = str(observation)
+
+    session_id = state.get('session_id') or DEFAULT_SESSION_ID
+    conversation_store.add_turn(session_id, "User", query)
+    conversation_store.add_turn(session_id, "Assistant", response_content)
+    metrics.incr("router_requests_total", route=selected.name)
+    metrics.incr("router_llm_calls_saved_total", LLM_CALLS_PER_ROUTED_REQUEST, route=selected.name)
+    metrics.observe("graph_node_duration_seconds", time.perf_counter() - node_start, node="router")
+    return {"route": selected.name, "messages": [{"role": "assistant", "content": response_content}]}
+
+
+def route_request(state: State, config: RunnableConfig = None):
+    """Answers unambiguous single-tool requests directly, without any LLM call."""
+    query, selected = _select_route(state)
+    if selected is None:
+        return {"route": "agent"}
+    node_start = time.perf_counter()
+    with node_context(config):
+        observation = _tools_by_name[selected.tool](**selected.arguments)
+        return _routed(state, query, selected, observation, node_start)
+
+
+async def aroute_request(state: State, config: RunnableConfig = None):
+    """route_request for ainvoke: the tool runs on the event loop or the inference executor."""
+    query, selected = _select_route(state)
+    if selected is None:
+        return {"route": "agent"}
+    node_start = time.perf_counter()
+    with node_context(config):
+        observation = await acall_tool(_tools_by_name[selected.tool], **selected.arguments)
+        # The conversation store may be SQLite
+        return await run_in(None, _routed, state, query, selected, observation, node_start)
+
+
+def after_routing(state: State) -> str:
+    """Sends requests the router did not answer on to the agent."""
+    return "agent" if state.get("route", "agent") == "agent" else END
+
+
+def stream_agent(agent, task):
+    """Runs the agent step by step, yielding step events and finally the answer."""
+    step_start = time.perf_counter()
+    deadline = time.monotonic() + AGENT_DEADLINE_SECONDS if AGENT_DEADLINE_SECONDS else None
+    for item in agent.run(task, stream=True, deadline=deadline, token_budget=AGENT_TOKEN_BUDGET or None):
+        if isinstance(item, dict) and ("iteration" in item or "error" in item):
+            now = time.perf_counter()
+            metrics.observe("agent_iteration_duration_seconds", now - step_start)
+            metrics.incr("agent_iterations_total")
+            if item.get("error"):
+                metrics.incr("agent_step_errors_total")
+            step_start = now
+            yield "step", _step_event(item)
+        else:
+            yield "final", item
 
-    recent_messages = "\n".join([message.content for message in messages[-2:]]) + "\n"
-    print(f"[DEBUG] recent messages in call__{recent_messages}{context}")
 
-    context += recent_messages
+@traceable
+def call_model(state: State, config: RunnableConfig = None):
+    """Invoke the model with the session's conversation history and current state."""
+    messages = state['messages']
+    session_id = state.get('session_id') or DEFAULT_SESSION_ID
+    node_start = time.perf_counter()
+    log_payload("messages in call__%s", messages)
 
-    limited_context = f"Previous context:\n{context[-500:]}\n"
+    limited_context = f"Previous context:\n{conversation_store.context(session_id)}\n"
 
     current_query = messages[-1].content if messages else ""
+    conversation_store.add_turn(session_id, "User", current_query)
 
-    print("[DEBUG] Sending query and context to agent:", current_query, limited_context)
+    log_payload("Sending query and context to agent: %s %s", current_query, limited_context)
 
     task = f"{limited_context}Current query:\n{current_query}\n"
-    print(f"[DEBUG] task in call__{task}")
+    log_payload("task in call__%s", task)
 
     try:
-        response = agent.run(task)
-        print(f"[DEBUG] xxxxxResponse from agent: {response}")
+        response = None
+        with node_context(config), borrow_agent() as agent:
+            for kind, payload in stream_agent(agent, task):
+                if kind == "step":
+                    emit("step", **payload)
+                else:
+                    response = payload
+        log_payload("Response from agent: %s", response)
     except Exception as e:
-        print(f"[DEBUG] Error during agent run: {str(e)}")
+        metrics.incr("agent_run_errors_total")
+        log_payload("Error during agent run: %s", e)
         response = f"Error: {str(e)}"
-    run = get_current_run_tree()
-    current_run_id = run.trace_id
 
     response_content = str(response)
-    print(f"[DEBUG] Processed response_content: {response_content}")
+    log_payload("Processed response_content: %s", response_content)
 
-    context += f"Assistant: {response_content}\n"
+    conversation_store.add_turn(session_id, "Assistant", response_content)
+    metrics.observe("graph_node_duration_seconds", time.perf_counter() - node_start, node="agent")
 
     return {"messages": [{"role": "assistant", "content": response_content}]}
 
+
+async def acall_model(state: State, config: RunnableConfig = None):
+    """call_model for ainvoke; the agent loop is synchronous, so it runs on the agent executor."""
+    return await run_in(agent_executor, call_model, state, config)
+
 # Define the workflow after all functions and variables are defined
 workflow = StateGraph(State)
-workflow.add_node("agent", call_model)
-workflow.add_edge(START, "agent")
+workflow.add_node("router", RunnableLambda(route_request, afunc=aroute_request))
+workflow.add_node("agent", RunnableLambda(call_model, afunc=acall_model))
+workflow.add_edge(START, "router")
+workflow.add_conditional_edges("router", after_routing)
 workflow.add_conditional_edges("agent", should_continue)
 app = workflow.compile()
\ No newline at end of file